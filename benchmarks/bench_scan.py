@@ -0,0 +1,180 @@
+"""
+掃描流程基準測試：在暫存目錄產生 N 條規則的合成相機畫面 (JPEG / PNG，含遺失、
+截斷損壞與不變的來源)，不開 GUI 直接驅動 TaskEngine._trigger_scan，比較各掃描模式的
+吞吐量 (rules/s、MB/s)、單條規則 p50 / p99 延遲與峰值記憶體。
+
+用法: python benchmarks/bench_scan.py -n 256 --size 1920x1080 --passes 3
+"""
+import argparse
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import resource  # Windows 沒有，峰值記憶體就不報
+except ImportError:
+    resource = None
+
+# 各模式覆寫的引擎參數
+MODES = {
+    "serial": {"scan_workers": 1},
+    "parallel": {"scan_workers": 8, "share_limit": 8},
+    "fastpath": {"scan_workers": 8, "share_limit": 8, "stat_fast_path": True},
+    "async": {"async_scan": True, "scan_workers": 8, "share_limit": 8},
+    "sharded": {"scan_processes": os.cpu_count() or 2, "scan_workers": 2, "share_limit": 8, "shard_by": "id"},
+}
+
+
+class QuietLogger:
+    def write_log(self, text, **fields):
+        pass
+
+
+def parse_size(text):
+    w, h = text.lower().split("x")
+    return int(w), int(h)
+
+
+def encode_frame(size, fmt, seed):
+    """產生帶雜訊的畫面 (純色圖壓縮後太小，不像真實相機)"""
+    from PIL import Image
+    rnd = random.Random(seed)
+    noise = Image.effect_noise(size, 32 + rnd.randint(0, 32)).convert("RGB")
+    tint = Image.new("RGB", size, tuple(rnd.randint(0, 255) for _ in range(3)))
+    buf = io.BytesIO()
+    Image.blend(noise, tint, 0.5).save(buf, fmt, **({"quality": 90} if fmt == "JPEG" else {}))
+    return buf.getvalue()
+
+
+def with_comment(jpeg, tag):
+    """在 SOI 後插入 COM 區段：畫面不變但內容雜湊不同，用來模擬「相機有更新」"""
+    payload = tag.encode()
+    return jpeg[:2] + b"\xff\xfe" + (len(payload) + 2).to_bytes(2, "big") + payload + jpeg[2:]
+
+
+def build_fixture(root, args):
+    """建立來源檔與規則清單，回傳 (rules, 會在每輪之間更新的規則 ID)"""
+    rnd = random.Random(args.seed)
+    src_dir = os.path.join(root, "src")
+    os.makedirs(src_dir)
+    bases = {fmt: [encode_frame(args.size, fmt, i) for i in range(args.variants)] for fmt in ("JPEG", "PNG")}
+
+    rules, changing = [], []
+    for i in range(1, args.n + 1):
+        fmt = "PNG" if rnd.random() < args.png else "JPEG"
+        name = f"cam{i:04d}.{'png' if fmt == 'PNG' else 'jpg'}"
+        data = bases[fmt][i % args.variants]
+        if fmt == "JPEG":
+            data = with_comment(data, f"{i}-0")
+        roll = rnd.random()
+        if roll < args.missing:
+            pass  # 不建立檔案
+        elif roll < args.missing + args.corrupt:
+            with open(os.path.join(src_dir, name), 'wb') as f:
+                f.write(data[:len(data) // 2])  # 截斷：模擬相機上傳到一半
+        else:
+            with open(os.path.join(src_dir, name), 'wb') as f:
+                f.write(data)
+            if fmt == "JPEG" and rnd.random() < args.change:
+                changing.append((i, name, data))
+        rules.append({
+            "id": i, "location": f"地點 {i}", "source_dir": src_dir, "source_filename": name,
+            "output_dir": "", "restore_dir": "", "target_x": 800, "target_y": 600,
+            "count_broken": 0, "count_no_update": 0, "count_missing": 0,
+            "last_hash": "", "enabled": True, "status": "停止",
+        })
+    return rules, changing
+
+
+def run_mode(mode, settings, rules, changing, workdir, passes):
+    """在獨立行程執行一種模式 (峰值 RSS 才不會互相干擾)"""
+    from rule_model import Rule
+    from task_engine import TaskEngine
+
+    rules = [Rule.from_dict(r)[0] for r in rules]
+    for r in rules:
+        r.output_dir = os.path.join(workdir, mode, "out")
+        r.restore_dir = os.path.join(workdir, mode, "restore")
+    engine = TaskEngine(rules, QuietLogger(), settings=settings, start=False)
+
+    results = []
+    for p in range(passes):
+        if p:
+            # 模擬相機更新：改寫一部分來源，其餘維持不變
+            for rid, name, data in changing:
+                with open(os.path.join(rules[0].source_dir, name), 'wb') as f:
+                    f.write(with_comment(data, f"{rid}-{p}-{mode}"))
+        engine.metrics = type(engine.metrics)()
+        engine.metrics.begin_pass()
+        started = time.perf_counter()
+        engine._trigger_scan()
+        elapsed = time.perf_counter() - started
+        stats = engine.metrics.end_pass(elapsed)
+        p50, _, p99 = engine.metrics.percentiles("rule") or (0, 0, 0)
+        results.append((elapsed, stats, p50, p99))
+    # 收掉 sharded 模式的子行程：要等它們結束回收後，RUSAGE_CHILDREN 才算得到
+    if engine._proc_pool is not None:
+        engine._proc_pool.shutdown(wait=True)
+    engine.stop()
+
+    peak = None
+    if resource is not None:
+        unit = 1024 if sys.platform != "darwin" else 1048576  # Linux 單位 KB，macOS 為 bytes
+        workers = None
+        if settings.get("scan_processes"):
+            # 已回收子行程中最大的一個 (不是加總)
+            workers = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / unit
+        peak = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unit, workers)
+    return results, peak
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-n", type=int, default=256, help="規則數")
+    ap.add_argument("--size", type=parse_size, default=(1920, 1080), help="來源解析度 WxH")
+    ap.add_argument("--png", type=float, default=0.1, help="PNG 來源比例")
+    ap.add_argument("--missing", type=float, default=0.05, help="遺失來源比例")
+    ap.add_argument("--corrupt", type=float, default=0.05, help="截斷損壞來源比例")
+    ap.add_argument("--change", type=float, default=0.2, help="每輪之間會更新的 JPEG 來源比例")
+    ap.add_argument("--variants", type=int, default=4, help="不同畫面的數量 (產生 4K 雜訊圖很慢)")
+    ap.add_argument("--passes", type=int, default=3, help="每種模式掃描幾輪 (第 1 輪為冷啟動)")
+    ap.add_argument("--modes", default=",".join(MODES), help="要比較的模式，以逗號分隔")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--keep", action="store_true", help="保留暫存目錄")
+    args = ap.parse_args()
+
+    root = tempfile.mkdtemp(prefix="iow-bench-")
+    try:
+        print(f"產生 {args.n} 條規則 ({args.size[0]}x{args.size[1]}) 於 {root} ...")
+        rules, changing = build_fixture(root, args)
+
+        print(f"{'模式':<10}{'輪':>3}{'秒':>8}{'rules/s':>10}{'MB/s':>8}{'p50 ms':>9}{'p99 ms':>9}  結果")
+        for mode in args.modes.split(","):
+            with ProcessPoolExecutor(max_workers=1) as ex:
+                results, peak = ex.submit(run_mode, mode, MODES[mode], rules, changing,
+                                          root, args.passes).result()
+            for p, (elapsed, stats, p50, p99) in enumerate(results, 1):
+                outcomes = " ".join(f"{k}={v}" for k, v in sorted(stats["outcomes"].items()))
+                print(f"{mode:<10}{p:>3}{elapsed:>8.2f}{args.n / elapsed:>10.1f}"
+                      f"{stats['bytes_read'] / 1048576 / elapsed:>8.1f}{p50 * 1000:>9.1f}{p99 * 1000:>9.1f}  {outcomes}")
+            if peak is not None:
+                coordinator, workers = peak
+                if workers is None:
+                    print(f"{'':<10}峰值 RSS {coordinator:.0f} MB")
+                else:
+                    print(f"{'':<10}峰值 RSS 協調者 {coordinator:.0f} MB，"
+                          f"子行程 (最大一個) {workers:.0f} MB x {MODES[mode]['scan_processes']}")
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+-s 縮圖微型基準測試：比較舊路徑 (完整解碼 + resize) 與新路徑 (draft + reducing_gap)
+用法: python benchmarks/bench_thumbnail.py --src 3840x2160 --dst 800x600 -n 20
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+from task_engine import make_thumbnail
+
+
+def make_jpeg(width, height, quality=90):
+    """產生帶雜訊的 JPEG (純色圖壓縮後太小，不像真實相機畫面)"""
+    noise = Image.effect_noise((width, height), 64).convert("RGB")
+    grad = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    buf = io.BytesIO()
+    Image.blend(noise, grad, 0.5).save(buf, "JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def old_path(data, size):
+    with Image.open(io.BytesIO(data)) as img:
+        img.resize(size).save(io.BytesIO(), "JPEG")
+
+
+def new_path(data, size, fit, resample):
+    with Image.open(io.BytesIO(data)) as img:
+        make_thumbnail(img, size, fit=fit, resample=resample).save(io.BytesIO(), "JPEG")
+
+
+def bench(fn, n):
+    fn()  # 暖身
+    started = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - started) / n * 1000
+
+
+def parse_size(text):
+    w, h = text.lower().split("x")
+    return int(w), int(h)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--src", type=parse_size, default=(3840, 2160), help="來源解析度 WxH")
+    ap.add_argument("--dst", type=parse_size, default=(800, 600), help="縮圖尺寸 WxH")
+    ap.add_argument("--fit", default="stretch", choices=["stretch", "contain"])
+    ap.add_argument("--resample", default="bicubic")
+    ap.add_argument("-n", type=int, default=20, help="每種路徑重複次數")
+    args = ap.parse_args()
+
+    data = make_jpeg(*args.src)
+    print(f"來源 {args.src[0]}x{args.src[1]} JPEG {len(data) / 1024:.0f} KB -> {args.dst[0]}x{args.dst[1]}")
+
+    t_old = bench(lambda: old_path(data, args.dst), args.n)
+    t_new = bench(lambda: new_path(data, args.dst, args.fit, args.resample), args.n)
+    print(f"舊路徑 (完整解碼 + resize): {t_old:8.1f} ms/張")
+    print(f"新路徑 (draft + reducing_gap): {t_new:8.1f} ms/張  ({t_old / t_new:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,58 +1,205 @@
-import json
-import os
-
-class ConfigManager:
-    def __init__(self, file_path="rules_config.json"):
-        self.file_path = file_path
-        self.base_dir = os.path.dirname(os.path.abspath(__file__))
-        self.default_img_dir = os.path.join(self.base_dir, "img")
-        
-        if not os.path.exists(self.default_img_dir):
-            os.makedirs(self.default_img_dir)
-            
-        self.default_rules = self._generate_empty_rules()
-
-    def _generate_empty_rules(self):
-        rules = []
-        for i in range(1, 257):
-            rule_item = {
-                "id": i,
-                "location": f"地點 {i}",
-                "source_dir": "",
-                "source_filename": "",
-                "output_dir": self.default_img_dir,
-                "restore_dir": "",
-                "target_x": 800,
-                "target_y": 600,
-                "count_broken": 0,
-                "count_no_update": 0,
-                "count_missing": 0,
-                "last_hash": "",
-                "enabled": False,
-                "status": "停止"
-            }
-            rules.append(rule_item)
-        return rules
-
-    def load_config(self):
-        if os.path.exists(self.file_path):
-            try:
-                with open(self.file_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception:
-                return self.default_rules
-        return self.default_rules
-
-    def save_config(self, data):
-        try:
-            with open(self.file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=4, ensure_ascii=False)
-            return True
-        except Exception:
-            return False
-
-    def update_rule(self, rule_id, new_data):
-        all_rules = self.load_config()
-        if 1 <= rule_id <= 256:
-            all_rules[rule_id - 1].update(new_data)
-            self.save_config(all_rules)
\ No newline at end of file
+import json
+import os
+import shutil
+import tempfile
+import threading
+from rule_model import Rule
+
+CONFIG_VERSION = 2
+DEFAULT_MAX_RULES = 256
+
+class ConfigManager:
+    """
+    設定檔格式 (version 2)：
+    {"version": 2, "max_rules": 256, "engine": {引擎參數}, "ui": {"widths": {...}}, "rules": [...]}
+    舊版 (純規則陣列、ui_widths 塞在第 1 筆) 讀取時自動轉換，下次存檔即改為新格式。
+    """
+    def __init__(self, file_path="rules_config.json", flush_delay=2.0, compact_every=500):
+        self.file_path = file_path
+        # 增量紀錄檔：每次只追加有變動的規則 (一行一筆 JSON)，累積夠多再整份壓實
+        self.journal_path = file_path + ".journal"
+        self.flush_delay = flush_delay        # 標記變動後延遲幾秒合併寫入
+        self.compact_every = compact_every    # 增量紀錄超過幾行就整份重寫主檔
+        self.base_dir = os.path.dirname(os.path.abspath(__file__))
+        self.default_img_dir = os.path.join(self.base_dir, "img")
+        
+        if not os.path.exists(self.default_img_dir):
+            os.makedirs(self.default_img_dir)
+
+        self.max_rules = DEFAULT_MAX_RULES  # 規則數上限 (可在設定檔 max_rules 調整)
+        self.engine_settings = {}           # 覆寫 TaskEngine.DEFAULT_SETTINGS 的參數
+        self.ui_settings = {}               # 介面設定 (欄位寬度等)，不再混在規則裡
+        self.load_errors = []               # 最近一次載入時發現的問題，交給呼叫端寫 log
+
+        self._rules = None          # 最近一次 load_config 回傳的規則清單
+        self._dirty = {}            # 等待寫入的規則，key 為規則 ID
+        self._journal_lines = 0
+        self._timer = None
+        self._lock = threading.RLock()
+
+    def _empty_rule(self, i):
+        return Rule(id=i, location=f"地點 {i}", output_dir=self.default_img_dir)
+
+    def load_config(self):
+        """讀取設定並驗證每筆規則；壞掉的欄位 / 規則記在 load_errors，不再默默換成預設值"""
+        self.load_errors = []
+        doc = None
+        if os.path.exists(self.file_path):
+            try:
+                with open(self.file_path, 'r', encoding='utf-8') as f:
+                    doc = json.load(f)
+            except Exception as e:
+                # 保留壞掉的原檔，避免之後存檔把它蓋掉
+                shutil.copyfile(self.file_path, self.file_path + ".corrupt")
+                self.load_errors.append(f"設定檔無法解析 ({e})，已另存為 {self.file_path}.corrupt，改用空白規則")
+
+        raw_rules = []
+        if isinstance(doc, list):
+            raw_rules = doc
+            for raw in doc:
+                if isinstance(raw, dict) and "ui_widths" in raw:
+                    self.ui_settings = {"widths": raw.pop("ui_widths")}
+        elif isinstance(doc, dict):
+            try:
+                self.max_rules = int(doc.get("max_rules", DEFAULT_MAX_RULES))
+            except (TypeError, ValueError):
+                self.load_errors.append(f"max_rules 無效: {doc.get('max_rules')!r}，改用 {DEFAULT_MAX_RULES}")
+            self.engine_settings = doc.get("engine") or {}
+            self.ui_settings = doc.get("ui") or {}
+            raw_rules = doc.get("rules") or []
+        elif doc is not None:
+            self.load_errors.append("設定檔格式不正確，改用空白規則")
+
+        rules, seen = [], set()
+        for raw in raw_rules:
+            rule, errors = Rule.from_dict(raw)
+            self.load_errors.extend(errors)
+            if rule is None:
+                continue
+            if rule.id in seen or not 1 <= rule.id <= self.max_rules:
+                self.load_errors.append(f"規則 {rule.id}: 編號重複或超出 1-{self.max_rules}，已略過")
+                continue
+            seen.add(rule.id)
+            rules.append(rule)
+
+        # 未設定的編號補上空白規則，清單依編號排序
+        rules.extend(self._empty_rule(i) for i in range(1, self.max_rules + 1) if i not in seen)
+        rules.sort(key=lambda r: r.id)
+
+        self._replay_journal(rules)
+        self._rules = rules
+        return rules
+
+    def _replay_journal(self, rules):
+        """把增量紀錄套回主檔內容 (最後一行若寫到一半就忽略)"""
+        self._journal_lines = 0
+        if not os.path.exists(self.journal_path):
+            return
+        by_id = {r.id: r for r in rules}
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                record.pop("ui_widths", None)   # 舊版紀錄會帶著欄寬
+                rule = by_id.get(record.pop("id", None))
+                if rule is not None:
+                    self.load_errors.extend(rule.update(record))
+                    self._journal_lines += 1
+
+    def _write_atomic(self, path, text):
+        """暫存檔 + fsync + rename，寫到一半當機也不會留下壞掉的主檔"""
+        folder = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".tmp-", suffix=".json")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def save_config(self, data=None):
+        """
+        整份寫入主檔 (原子寫入)。data 省略時用 mark_dirty 收到的最新完整清單，
+        讀清單與清增量都在同一把鎖內，不會把寫入前剛標記的新變動丟掉。
+        """
+        with self._lock:
+            if data is None:
+                data = self._rules or []
+            doc = {
+                "version": CONFIG_VERSION,
+                "max_rules": self.max_rules,
+                "engine": self.engine_settings,
+                "ui": self.ui_settings,
+                "rules": [r.to_dict() for r in data],
+            }
+            try:
+                self._write_atomic(self.file_path, json.dumps(doc, indent=4, ensure_ascii=False))
+            except Exception:
+                return False
+            self._rules = data
+            # 只清掉這次確實寫進去的規則；呼叫端給的清單若比增量舊，較新的變動留著下次寫
+            written = {id(r) for r in data}
+            for rid in [rid for rid, r in self._dirty.items() if id(r) in written]:
+                del self._dirty[rid]
+            try:
+                if os.path.exists(self.journal_path):
+                    os.remove(self.journal_path)
+                self._journal_lines = 0
+            except OSError:
+                pass
+            if self._dirty:
+                self.mark_dirty([])
+            return True
+
+    def mark_dirty(self, rules, all_rules=None):
+        """
+        標記有變動的規則，延遲 flush_delay 秒後合併成一次增量寫入。
+        all_rules 為目前完整的規則清單 (引擎發佈的新快照)，壓實主檔時用它。
+        """
+        with self._lock:
+            if all_rules is not None:
+                self._rules = list(all_rules)
+            for r in rules:
+                self._dirty[r.id] = r
+            if self._dirty and self._timer is None:
+                self._timer = threading.Timer(self.flush_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """把累積的變動規則追加到增量紀錄；紀錄太長就整份壓實"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return True
+
+            pending, self._dirty = self._dirty, {}
+            lines = [json.dumps(r.to_dict(), ensure_ascii=False) for r in pending.values()]
+
+            if lines:
+                try:
+                    with open(self.journal_path, 'a', encoding='utf-8') as f:
+                        f.write("\n".join(lines) + "\n")
+                        f.flush()
+                        os.fsync(f.fileno())
+                    self._journal_lines += len(lines)
+                except Exception:
+                    # 寫入失敗就全部放回，下次再試
+                    pending.update(self._dirty)
+                    self._dirty = pending
+                    self.mark_dirty([])
+                    return False
+
+            if self._journal_lines >= self.compact_every and self._rules is not None:
+                self.save_config(self._rules)
+            if self._dirty:
+                self.mark_dirty([])
+            return True
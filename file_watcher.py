@@ -0,0 +1,109 @@
+import os
+import threading
+
+try:
+    # 選用套件：Linux 走 inotify、Windows 走 ReadDirectoryChangesW
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+
+def watch_key(directory, filename):
+    """監看目標的正規化 key：(絕對路徑目錄, 檔名)"""
+    return os.path.normcase(os.path.abspath(directory)), os.path.normcase(filename)
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, watcher):
+        super().__init__()
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.is_directory or event.event_type in ("opened", "closed_no_write"):
+            return
+        path = getattr(event, "dest_path", "") or event.src_path
+        self.watcher._notify(*watch_key(*os.path.split(path)))
+        if event.event_type == "moved":
+            self.watcher._notify(*watch_key(*os.path.split(event.src_path)))
+
+
+class SourceWatcher:
+    """
+    監看來源檔變動，有變動就呼叫 on_change(目錄, 檔名)。
+    本機目錄優先用檔案系統事件 (需安裝 watchdog)；網路路徑、沒有 watchdog
+    或事件訂閱失敗的目錄則退回輪詢 (每 poll_interval 秒 stat 一次被監看的檔案)。
+    """
+    def __init__(self, on_change, poll_interval=2.0):
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self._targets = {}       # 目錄 -> 該目錄下被監看的檔名集合
+        self._poll_dirs = set()  # 需要輪詢的目錄
+        self._last_stat = {}     # (目錄, 檔名) -> (mtime_ns, size)，輪詢比對用
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+        self._observer = None
+        self._watches = {}       # 目錄 -> watchdog 的 watch 物件
+        if Observer is not None:
+            self._observer = Observer()
+            self._observer.daemon = True
+            self._observer.start()
+
+        self.thread = threading.Thread(target=self._poll_loop, name="source-poll", daemon=True)
+        self.thread.start()
+
+    @property
+    def uses_events(self):
+        return self._observer is not None
+
+    def update(self, keys):
+        """設定要監看的 (目錄, 檔名) 集合 (用 watch_key 正規化過)"""
+        targets = {}
+        for directory, filename in keys:
+            targets.setdefault(directory, set()).add(filename)
+
+        with self._lock:
+            self._targets = targets
+            self._poll_dirs = set()
+            for directory in list(self._watches):
+                if directory not in targets:
+                    self._observer.unschedule(self._watches.pop(directory))
+            for directory in targets:
+                if directory in self._watches:
+                    continue
+                if self._observer is None or directory.startswith(("\\\\", "//")):
+                    self._poll_dirs.add(directory)
+                    continue
+                try:
+                    self._watches[directory] = self._observer.schedule(_EventHandler(self), directory)
+                except OSError:
+                    # 目錄不存在或分享不支援事件通知
+                    self._poll_dirs.add(directory)
+
+    def stop(self):
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+
+    def _notify(self, directory, filename):
+        with self._lock:
+            watched = filename in self._targets.get(directory, ())
+        if watched:
+            self.on_change(directory, filename)
+
+    def _poll_loop(self):
+        while not self._stop.wait(self.poll_interval):
+            with self._lock:
+                keys = [(d, f) for d in self._poll_dirs for f in self._targets.get(d, ())]
+            for key in keys:
+                try:
+                    st = os.stat(os.path.join(*key))
+                    current = (st.st_mtime_ns, st.st_size)
+                except OSError:
+                    current = None
+                previous = self._last_stat.get(key, current)
+                self._last_stat[key] = current
+                if current != previous:
+                    self.on_change(*key)
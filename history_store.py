@@ -0,0 +1,128 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+
+
+class HistoryStore:
+    """
+    {output_dir}/.history 下的內容定址備份歷史 (多條規則共用同一輸出目錄時共用一份)：
+      blobs/<演算法>-<雜湊><副檔名>   原始畫面，同內容只存一份
+      index/<規則 ID>.json            [時間, 雜湊, 副檔名, 大小] 清單，最新的在最後
+    每條規則最多保留 depth 筆；超過 max_age 秒或總大小超過 max_bytes 時從最舊的開始丟，
+    但每條規則最新的一筆一定保留。blob 沒有任何紀錄引用時才刪除。
+    """
+    def __init__(self, root, depth, max_age=0, max_bytes=0):
+        self.root = root
+        self.blob_dir = os.path.join(root, "blobs")
+        self.index_dir = os.path.join(root, "index")
+        self.depth = max(1, int(depth))
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+
+        self._index = {}        # 規則 ID -> 紀錄清單
+        self._refs = Counter()  # blob 檔名 -> 被幾筆紀錄引用
+        self._sizes = {}        # blob 檔名 -> 大小
+        self._lock = threading.Lock()
+        self._load()
+
+    def _blob_name(self, content_hash, ext):
+        return content_hash.replace(":", "-") + ext
+
+    def _load(self):
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.index_dir, exist_ok=True)
+        for name in os.listdir(self.index_dir):
+            stem, ext = os.path.splitext(name)
+            if ext != ".json" or not stem.isdigit():
+                continue
+            try:
+                with open(os.path.join(self.index_dir, name), 'r', encoding='utf-8') as f:
+                    entries = json.load(f)
+            except (OSError, ValueError):
+                continue
+            self._index[int(stem)] = entries
+            for entry in entries:
+                self._ref(entry)
+
+    def _ref(self, entry):
+        name = self._blob_name(entry[1], entry[2])
+        if not self._refs[name]:
+            self._sizes[name] = entry[3]
+            self.total_bytes += entry[3]
+        self._refs[name] += 1
+
+    def _unref(self, entry):
+        name = self._blob_name(entry[1], entry[2])
+        self._refs[name] -= 1
+        if self._refs[name] <= 0:
+            del self._refs[name]
+            self.total_bytes -= self._sizes.pop(name, 0)
+            try:
+                os.remove(os.path.join(self.blob_dir, name))
+            except OSError:
+                pass
+
+    def _write_atomic(self, path, data, mode='wb'):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, mode) as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _save_index(self, rule_id):
+        path = os.path.join(self.index_dir, f"{rule_id}.json")
+        entries = self._index.get(rule_id)
+        if entries:
+            self._write_atomic(path, json.dumps(entries, separators=(",", ":")).encode("utf-8"))
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def add(self, rule_id, content_hash, data, ext, now=None):
+        """記錄一張通過檢查的畫面 (data 可為 bytes 或 mmap)；內容已存在就只加紀錄不重寫 blob"""
+        now = time.time() if now is None else now
+        name = self._blob_name(content_hash, ext)
+        path = os.path.join(self.blob_dir, name)
+        with self._lock:
+            entries = self._index.setdefault(rule_id, [])
+            if entries and entries[-1][1] == content_hash:
+                return
+            if not os.path.exists(path):
+                self._write_atomic(path, data)
+            entry = [round(now, 3), content_hash, ext, len(data)]
+            entries.append(entry)
+            self._ref(entry)
+
+            # 依筆數與時間淘汰這條規則的舊紀錄
+            while len(entries) > self.depth or (
+                    self.max_age and len(entries) > 1 and now - entries[0][0] > self.max_age):
+                self._unref(entries.pop(0))
+            changed = {rule_id}
+
+            # 總大小超過上限：從所有規則中最舊的紀錄開始丟
+            while self.max_bytes and self.total_bytes > self.max_bytes:
+                oldest = min(((e[0][0], rid) for rid, e in self._index.items() if len(e) > 1), default=None)
+                if oldest is None:
+                    break
+                self._unref(self._index[oldest[1]].pop(0))
+                changed.add(oldest[1])
+
+            for rid in changed:
+                self._save_index(rid)
+
+    def latest(self, rule_id):
+        """最新一筆的 (時間, blob 路徑)；沒有紀錄或 blob 不見了就回傳 None"""
+        with self._lock:
+            entries = self._index.get(rule_id)
+            if not entries:
+                return None
+            ts, content_hash, ext, _ = entries[-1]
+        path = os.path.join(self.blob_dir, self._blob_name(content_hash, ext))
+        return (ts, path) if os.path.exists(path) else None
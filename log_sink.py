@@ -0,0 +1,115 @@
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime
+
+class LogFileSink:
+    """
+    RAMLogger 背後的落地紀錄：背景執行緒批次寫檔，依大小/時間輪替，舊檔可 gzip。
+    每筆紀錄是一行 JSON (ts, msg 以及 rule / outcome / duration_ms 等欄位)，方便 grep 與離線分析。
+    """
+    def __init__(self, log_dir, base_name="iow.log", max_bytes=10 * 1024 * 1024,
+                 rotate_seconds=24 * 3600, backup_count=30, compress=True, flush_interval=1.0):
+        self.log_dir = log_dir
+        self.path = os.path.join(log_dir, base_name)
+        # 目前這一段開始寫的時間 (點開頭，不會被 _prune 當成輪替出去的舊檔)
+        self.started_path = os.path.join(log_dir, f".{base_name}.started")
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.backup_count = backup_count
+        self.compress = compress
+        self.flush_interval = flush_interval
+
+        os.makedirs(log_dir, exist_ok=True)
+        self._queue = queue.SimpleQueue()
+        self._file = None
+        self._opened_at = 0
+        self._stop = object()  # 關閉用的哨兵
+
+        self.thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+        self.thread.start()
+
+    def write(self, record):
+        """任何執行緒都可以呼叫，只進佇列，不做檔案 I/O"""
+        self._queue.put(record)
+
+    def close(self, timeout=5.0):
+        self._queue.put(self._stop)
+        self.thread.join(timeout)
+
+    def _open(self):
+        self._file = open(self.path, 'a', encoding='utf-8', buffering=64 * 1024)
+        # 輪替週期從這一段開始寫的時間起算：沿用既有檔案時讀回記錄的時間，重開程式不會重新計時
+        now = time.time()
+        started = None
+        if self._file.tell():
+            try:
+                with open(self.started_path, 'r', encoding='utf-8') as f:
+                    started = float(f.read())
+            except (OSError, ValueError):
+                pass
+        if started is None or started > now:
+            started = now
+            try:
+                with open(self.started_path, 'w', encoding='utf-8') as f:
+                    f.write(repr(now))
+            except OSError:
+                pass
+        self._opened_at = started
+
+    def _run(self):
+        self._open()
+        while True:
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+                while True:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            stop = self._stop in batch
+            try:
+                for record in batch:
+                    if record is not self._stop:
+                        self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                self._file.flush()
+
+                if stop:
+                    self._file.close()
+                    return
+                if self._file.tell() >= self.max_bytes or time.time() - self._opened_at >= self.rotate_seconds:
+                    if self._file.tell():
+                        self._rotate()
+            except OSError:
+                # 磁碟滿或被鎖住：丟掉這一批，不讓寫檔執行緒死掉
+                if self._file.closed:
+                    self._open()
+
+    def _rotate(self):
+        """目前檔案改名為 iow.log.YYYYmmdd-HHMMSS[.gz]，並刪掉超過 backup_count 的舊檔"""
+        self._file.close()
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        rotated, n = f"{self.path}.{stamp}", 1
+        while os.path.exists(rotated) or os.path.exists(rotated + ".gz"):
+            rotated, n = f"{self.path}.{stamp}-{n}", n + 1
+        os.replace(self.path, rotated)
+        if self.compress:
+            with open(rotated, 'rb') as src, gzip.open(rotated + ".gz", 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(rotated)
+        self._prune()
+        self._open()
+
+    def _prune(self):
+        prefix = os.path.basename(self.path) + "."
+        old = sorted(f for f in os.listdir(self.log_dir) if f.startswith(prefix))
+        for name in old[:-self.backup_count] if self.backup_count else []:
+            try:
+                os.remove(os.path.join(self.log_dir, name))
+            except OSError:
+                pass
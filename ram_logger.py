@@ -1,52 +1,85 @@
-import customtkinter as ctk
-from tkinter import Menu
-from collections import deque
-
-class RAMLogger(ctk.CTkTextbox):
-    def __init__(self, master, max_lines=2000, **kwargs): # max_lines 可自行調整
-        super().__init__(master, **kwargs)
-        self.log_data = deque(maxlen=max_lines) # 自動推擠的核心
-        self.configure(state="disabled")
-        
-        # 右鍵選單
-        self.menu = Menu(self, tearoff=0)
-        self.menu.add_command(label="複製全部 (Copy All)", command=self.copy_all)
-        self.menu.add_command(label="另存 Log (Save as)", command=self.save_to_file)
-        self.menu.add_separator()
-        self.menu.add_command(label="清空 (Clear)", command=self.clear_log)
-        self.bind("<Button-3>", self.show_menu)
-
-    def write_log(self, text):
-        """
-        這是我標示出的功能函數，內容您可以之後自行精簡。
-        """
-        import datetime
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        # 這裡的文字格式您可以自行修改
-        log_entry = f"[{timestamp}] {text}"
-        self.log_data.append(log_entry)
-        
-        # 刷新介面顯示
-        self.configure(state="normal")
-        self.delete("1.0", "end")
-        self.insert("end", "\n".join(self.log_data))
-        self.see("end")
-        self.configure(state="disabled")
-
-    def show_menu(self, event):
-        self.menu.post(event.x_root, event.y_root)
-
-    def copy_all(self):
-        self.clipboard_clear()
-        self.clipboard_append("\n".join(self.log_data))
-
-    def save_to_file(self):
-        # 這裡留給您未來實作 file_save_as 邏輯
-        pass
-
-    def clear_log(self):
-        self.log_data.clear()
-        self.configure(state="normal")
-        self.delete("1.0", "end")
+import queue
+import customtkinter as ctk
+from tkinter import Menu, filedialog
+from collections import deque
+
+class RAMLogger(ctk.CTkTextbox):
+    def __init__(self, master, max_lines=2000, flush_ms=100, sink=None, **kwargs): # max_lines 可自行調整
+        super().__init__(master, **kwargs)
+        self.log_data = deque(maxlen=max_lines) # 自動推擠的核心
+        self.sink = sink  # LogFileSink：超過 max_lines 的歷史仍會留在硬碟上
+        self.configure(state="disabled")
+
+        # 任何執行緒都只把訊息丟進佇列，由 Tk 執行緒每 flush_ms 毫秒批次畫上去
+        self._pending = queue.SimpleQueue()
+        self._shown_lines = 0  # 目前文字框內的行數
+        self.flush_ms = flush_ms
+        self.after(self.flush_ms, self._drain)
+        
+        # 右鍵選單
+        self.menu = Menu(self, tearoff=0)
+        self.menu.add_command(label="複製全部 (Copy All)", command=self.copy_all)
+        self.menu.add_command(label="另存 Log (Save as)", command=self.save_to_file)
+        self.menu.add_separator()
+        self.menu.add_command(label="清空 (Clear)", command=self.clear_log)
+        self.bind("<Button-3>", self.show_menu)
+
+    def write_log(self, text, **fields):
+        """
+        這是我標示出的功能函數，內容您可以之後自行精簡。
+        fields 為結構化欄位 (rule, outcome, duration_ms...)，只寫進落地紀錄檔。
+        """
+        import datetime
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        
+        # 這裡的文字格式您可以自行修改
+        log_entry = f"[{timestamp}] {text}"
+        if self.sink is not None:
+            self.sink.write({"ts": timestamp, "msg": text, **fields})
+
+        # 背景執行緒也可以直接呼叫：只進佇列，不碰 Tk 元件也不等待畫面
+        self._pending.put(log_entry)
+
+    def _drain(self):
+        """Tk 執行緒定時取出佇列：只追加新行，超過上限時從頂端刪掉多出的行"""
+        entries = []
+        try:
+            while True:
+                entries.append(self._pending.get_nowait())
+        except queue.Empty:
+            pass
+
+        if entries:
+            self.log_data.extend(entries)
+            self.configure(state="normal")
+            self.insert("end", ("\n" if self._shown_lines else "") + "\n".join(entries))
+            self._shown_lines += sum(e.count("\n") + 1 for e in entries)
+            overflow = self._shown_lines - self.log_data.maxlen
+            if overflow > 0:
+                self.delete("1.0", f"{overflow + 1}.0")
+                self._shown_lines -= overflow
+            self.see("end")
+            self.configure(state="disabled")
+
+        self.after(self.flush_ms, self._drain)
+
+    def show_menu(self, event):
+        self.menu.post(event.x_root, event.y_root)
+
+    def copy_all(self):
+        self.clipboard_clear()
+        self.clipboard_append("\n".join(self.log_data))
+
+    def save_to_file(self):
+        path = filedialog.asksaveasfilename(defaultextension=".log",
+                                            filetypes=[("Log", "*.log *.txt"), ("全部", "*.*")])
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write("\n".join(self.log_data) + "\n")
+
+    def clear_log(self):
+        self.log_data.clear()
+        self._shown_lines = 0
+        self.configure(state="normal")
+        self.delete("1.0", "end")
         self.configure(state="disabled")
\ No newline at end of file
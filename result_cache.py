@@ -0,0 +1,42 @@
+import threading
+from collections import OrderedDict
+
+
+class ResultCache:
+    """
+    以總位元組數為上限的 LRU 快取 (執行緒安全)。
+    掃描時用來存「同一份內容」的處理結果，key 以內容雜湊開頭，例如
+    (雜湊, "thumb", (800, 600), fit, resample) -> 編碼好的 -s JPEG 位元組。
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items = OrderedDict()  # key -> (value, 佔用位元組)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """命中就移到最新並回傳值，否則回傳 None"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            self._items.move_to_end(key)
+            return item[0]
+
+    def put(self, key, value, size=None):
+        """放入快取 (size 省略時用 len(value))，超過上限就從最久沒用的開始丟"""
+        size = len(value) if size is None else size
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self._items[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, dropped) = self._items.popitem(last=False)
+                self.size -= dropped
+
+    def __len__(self):
+        return len(self._items)
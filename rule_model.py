@@ -0,0 +1,169 @@
+from dataclasses import dataclass, asdict, field, fields
+from typing import Optional, get_args
+
+# 縮圖變體可用的格式 -> 副檔名
+VARIANT_FORMATS = {"jpeg": ".jpg", "webp": ".webp"}
+
+@dataclass(slots=True)
+class Rule:
+    """單條備份規則 (固定欄位，用 __slots__ 省記憶體與屬性查找成本)"""
+    id: int
+    location: str = ""
+    source_dir: str = ""
+    source_filename: str = ""
+    output_dir: str = ""
+    restore_dir: str = ""
+    target_x: int = 800
+    target_y: int = 600
+    resample: str = "bicubic"
+    fit: str = "stretch"
+    interval: float = 0.0
+    schedule_minutes: str = ""
+    backoff: float = 1.0
+    strict: bool = False
+    variants: list = field(default_factory=list)  # 縮圖變體，空 = 只有 target_x / target_y 的 -s
+    count_broken: int = 0
+    count_no_update: int = 0
+    count_missing: int = 0
+    last_hash: str = ""
+    enabled: bool = False
+    status: str = "停止"
+    last_stat: Optional[list] = None
+    last_restore: Optional[dict] = None
+
+    @classmethod
+    def from_dict(cls, data):
+        """由 JSON dict 建立規則，回傳 (Rule 或 None, 錯誤訊息清單)；壞掉的欄位用預設值並回報"""
+        if not isinstance(data, dict):
+            return None, [f"規則資料不是物件: {data!r:.60}"]
+        try:
+            rid = _coerce(int, data.get("id"))
+        except ValueError:
+            return None, [f"規則缺少有效的 id: {data.get('id')!r}"]
+        rule = cls(id=rid)
+        return rule, rule.update({k: v for k, v in data.items() if k != "id"})
+
+    def update(self, data):
+        """套用欄位變更 (型別不符或未知欄位不套用)，回傳錯誤訊息清單"""
+        errors = []
+        for key, value in data.items():
+            kind = FIELD_KINDS.get(key)
+            if kind is None or key == "id":
+                errors.append(f"規則 {self.id}: 未知欄位 {key}，已忽略")
+                continue
+            try:
+                value = _coerce(kind, value)
+                if key == "variants":
+                    value = _check_variants(value or [])
+                elif key == "schedule_minutes":
+                    value = check_schedule_minutes(value)
+                setattr(self, key, value)
+            except ValueError:
+                errors.append(f"規則 {self.id}: {key} 應為 {kind.__name__}，收到 {value!r:.60}，此欄不套用")
+        return errors
+
+    def to_dict(self):
+        return asdict(self)
+
+    def output_variants(self):
+        """要產生的縮圖變體，由大到小排序；沒設定 variants 時就是 target_x / target_y 的 -s JPEG"""
+        variants = self.variants or [
+            {"size": [self.target_x, self.target_y], "format": "jpeg", "quality": 0, "suffix": "-s"}]
+        return sorted(variants, key=lambda v: v["size"][0] * v["size"][1], reverse=True)
+
+
+def check_schedule_minutes(value):
+    """檢查「指定分鐘」(例如 "0, 30")：逗號分隔的 0-59 整數，回傳正規化字串，不符就丟 ValueError"""
+    minutes = []
+    for part in str(value).split(","):
+        if part.strip():
+            minute = _coerce(int, part.strip())
+            if not 0 <= minute <= 59:
+                raise ValueError(value)
+            minutes.append(minute)
+    return ",".join(str(m) for m in sorted(set(minutes)))
+
+
+def _check_variant(value):
+    """
+    檢查單一縮圖變體並補上預設值，不符就丟 ValueError：
+    {"size": [寬, 高], "format": "jpeg" / "webp", "quality": 1-100 (0 = 預設), "suffix": "-m"}
+    """
+    if not isinstance(value, dict):
+        raise ValueError(value)
+    size = value.get("size")
+    if not isinstance(size, (list, tuple)) or len(size) != 2:
+        raise ValueError(value)
+    w, h = (_coerce(int, n) for n in size)
+    fmt = str(value.get("format", "jpeg")).lower().replace("jpg", "jpeg")
+    quality = _coerce(int, value.get("quality", 0))
+    suffix = _coerce(str, value.get("suffix")) or f"-{w}x{h}"
+    if w <= 0 or h <= 0 or fmt not in VARIANT_FORMATS or not 0 <= quality <= 100:
+        raise ValueError(value)
+    if suffix == "-o" or any(c in suffix for c in '\\/:*?"<>|'):
+        raise ValueError(value)  # 不能蓋掉原始尺寸檔或寫到別的目錄
+    return {"size": [w, h], "format": fmt, "quality": quality, "suffix": suffix}
+
+
+def _check_variants(values):
+    variants = [_check_variant(v) for v in values]
+    names = {(v["suffix"], v["format"]) for v in variants}
+    if len(names) != len(variants):
+        raise ValueError(values)  # 後綴 + 格式重複會寫到同一個檔
+    return variants
+
+
+def variants_to_text(variants):
+    """縮圖變體轉成編輯用文字，一行一個：寬x高 格式 品質 後綴"""
+    return "\n".join(f"{v['size'][0]}x{v['size'][1]} {v['format']} {v['quality']} {v['suffix']}"
+                     for v in variants)
+
+
+def variants_from_text(text):
+    """解析 variants_to_text 的格式 (格式、品質、後綴可省略)，格式不符就丟 ValueError"""
+    variants = []
+    for line in text.splitlines():
+        parts = line.split()
+        if not parts:
+            continue
+        w, _, h = parts[0].lower().partition("x")
+        variant = {"size": [w, h]}
+        for key, part in zip(("format", "quality", "suffix"), parts[1:]):
+            variant[key] = part
+        variants.append(variant)
+    return _check_variants(variants)
+
+
+def _coerce(kind, value):
+    """寬鬆的型別轉換：接受舊設定檔中以字串存的數字，其餘不符就丟 ValueError"""
+    if kind is bool:
+        if isinstance(value, bool):
+            return value
+    elif kind is int:
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        if isinstance(value, str) and value.strip().lstrip("-").isdigit():
+            return int(value)
+    elif kind is float:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+        if isinstance(value, str):
+            return float(value)
+    elif kind is str:
+        if isinstance(value, str):
+            return value
+        if value is None:
+            return ""
+    elif value is None or isinstance(value, kind):
+        return value
+    raise ValueError(value)
+
+
+def _field_kind(tp):
+    args = [a for a in get_args(tp) if a is not type(None)]
+    return args[0] if args else tp
+
+
+FIELD_KINDS = {f.name: _field_kind(f.type) for f in fields(Rule)}
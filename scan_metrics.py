@@ -0,0 +1,161 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+# 記錄耗時的階段名稱 (rule = 單條規則總耗時)
+STAGES = ("exists", "read", "verify", "hash", "encode", "write", "restore", "rule")
+
+
+class ScanMetrics:
+    """
+    掃描指標：各階段耗時的滾動視窗 (算 p50 / p90 / p99)、結果計數與讀寫位元組數。
+    掃描執行緒與平行 worker 都會呼叫，所有更新都在同一把鎖內完成。
+    """
+    def __init__(self, window=2048):
+        self._lock = threading.Lock()
+        self.timings = {stage: deque(maxlen=window) for stage in STAGES}
+        self.outcomes = Counter()
+        self.cache = Counter()      # 結果快取 hit / miss 次數
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.passes = 0
+        self.last_pass_seconds = 0.0
+        self._pass_start = None
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0)
+
+    def observe(self, name, seconds):
+        with self._lock:
+            self.timings[name].append(seconds)
+
+    def count_outcome(self, outcome):
+        with self._lock:
+            self.outcomes[outcome] += 1
+
+    def count_cache(self, hit):
+        with self._lock:
+            self.cache["hit" if hit else "miss"] += 1
+
+    def add_bytes(self, read=0, written=0):
+        with self._lock:
+            self.bytes_read += read
+            self.bytes_written += written
+
+    def begin_pass(self):
+        """記下本輪開始時的累計值，end_pass 時算出差額"""
+        with self._lock:
+            self._pass_start = (Counter(self.outcomes), Counter(self.cache), self.bytes_read, self.bytes_written)
+
+    def end_pass(self, seconds):
+        """回傳本輪的結果計數與讀寫量"""
+        with self._lock:
+            outcomes, cache, read, written = self._pass_start or (Counter(), Counter(), 0, 0)
+            self.passes += 1
+            self.last_pass_seconds = seconds
+            return {
+                "outcomes": dict(self.outcomes - outcomes),
+                "cache_hits": self.cache["hit"] - cache["hit"],
+                "cache_misses": self.cache["miss"] - cache["miss"],
+                "bytes_read": self.bytes_read - read,
+                "bytes_written": self.bytes_written - written,
+            }
+
+    def samples(self):
+        """原始樣本 (可 pickle)，給子行程把本輪指標傳回協調者"""
+        with self._lock:
+            return {
+                "timings": {name: list(values) for name, values in self.timings.items() if values},
+                "outcomes": dict(self.outcomes),
+                "cache": dict(self.cache),
+                "bytes_read": self.bytes_read,
+                "bytes_written": self.bytes_written,
+            }
+
+    def merge(self, samples):
+        """併入 samples() 的結果"""
+        with self._lock:
+            for name, values in samples["timings"].items():
+                self.timings[name].extend(values)
+            self.outcomes.update(samples["outcomes"])
+            self.cache.update(samples["cache"])
+            self.bytes_read += samples["bytes_read"]
+            self.bytes_written += samples["bytes_written"]
+
+    def percentiles(self, name, qs=(0.5, 0.9, 0.99)):
+        with self._lock:
+            values = sorted(self.timings[name])
+        if not values:
+            return None
+        return tuple(values[min(len(values) - 1, int(q * len(values)))] for q in qs)
+
+    def summary_line(self, pass_stats):
+        """本輪摘要：結果計數、讀寫量，以及滾動視窗內各階段 p50 / p99 (毫秒)"""
+        outcome_text = " ".join(f"{k}={v}" for k, v in sorted(pass_stats["outcomes"].items())) or "無"
+        parts = []
+        for name in STAGES:
+            p = self.percentiles(name)
+            if p:
+                parts.append(f"{name} {p[0] * 1000:.1f}/{p[2] * 1000:.1f}")
+        return (f"結果: {outcome_text}；讀 {pass_stats['bytes_read'] / 1048576:.1f} MB，"
+                f"寫 {pass_stats['bytes_written'] / 1048576:.1f} MB；"
+                f"快取 命中 {pass_stats['cache_hits']} / 未命中 {pass_stats['cache_misses']}；"
+                f"p50/p99 ms: {', '.join(parts)}")
+
+    def snapshot(self):
+        """目前所有指標 (給 JSON 匯出)"""
+        data = {"passes": self.passes, "last_pass_seconds": self.last_pass_seconds, "stages": {}}
+        for name in STAGES:
+            p = self.percentiles(name)
+            if p:
+                data["stages"][name] = {"p50": p[0], "p90": p[1], "p99": p[2],
+                                        "samples": len(self.timings[name])}
+        with self._lock:
+            data["outcomes"] = dict(self.outcomes)
+            data["cache"] = dict(self.cache)
+            data["bytes_read"] = self.bytes_read
+            data["bytes_written"] = self.bytes_written
+        return data
+
+    def to_prometheus(self):
+        snap = self.snapshot()
+        lines = [
+            "# TYPE iow_scan_passes_total counter",
+            f"iow_scan_passes_total {snap['passes']}",
+            "# TYPE iow_scan_last_pass_seconds gauge",
+            f"iow_scan_last_pass_seconds {snap['last_pass_seconds']:.6f}",
+            "# TYPE iow_scan_bytes_read_total counter",
+            f"iow_scan_bytes_read_total {snap['bytes_read']}",
+            "# TYPE iow_scan_bytes_written_total counter",
+            f"iow_scan_bytes_written_total {snap['bytes_written']}",
+            "# TYPE iow_scan_outcomes_total counter",
+        ]
+        for outcome, n in sorted(snap["outcomes"].items()):
+            lines.append(f'iow_scan_outcomes_total{{outcome="{outcome}"}} {n}')
+        lines.append("# TYPE iow_scan_cache_lookups_total counter")
+        for result, n in sorted(snap["cache"].items()):
+            lines.append(f'iow_scan_cache_lookups_total{{result="{result}"}} {n}')
+        lines.append("# TYPE iow_scan_stage_seconds summary")
+        for name, st in snap["stages"].items():
+            for q in ("p50", "p90", "p99"):
+                lines.append(f'iow_scan_stage_seconds{{stage="{name}",quantile="0.{q[1:]}"}} {st[q]:.6f}')
+            lines.append(f'iow_scan_stage_seconds_count{{stage="{name}"}} {st["samples"]}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, path, fmt="json"):
+        """原子寫入匯出檔 (prometheus 文字格式或 JSON)"""
+        text = self.to_prometheus() if fmt == "prometheus" else json.dumps(self.snapshot(), indent=2)
+        folder = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".tmp-metrics-")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
@@ -1,209 +1,331 @@
-import customtkinter as ctk
-from tkinter import ttk, simpledialog
-from config_manager import ConfigManager
-from tabs.rule_editor import RuleEditor
-from task_engine import TaskEngine
-
-
-class Tab4Backup(ctk.CTkFrame):
-    def __init__(self, master, logger, **kwargs):
-        super().__init__(master, **kwargs)
-        self.logger = logger
-        self.config_mgr = ConfigManager()
-        self.rules_data = self.config_mgr.load_config()
-        # 建立「本次開機」專用的小帳本 (Dict)，key 為規則 ID
-        self.session_errors = {
-            r.get("id"): {"broken": 0, "no_upd": 0, "lost": 0}
-            for r in self.rules_data
-        }
-
-        # UI 變數
-        self.timer_mode = ctk.StringVar(value="固定秒數")
-        self.timer_setting = ctk.StringVar(value="10.0")
-        self.countdown_text = ctk.StringVar(value="等待啟動...")
-
-        # --- 新增：每次啟動時將計數器歸零 ---
-        # if self.rules_data:
-        #    for rule in self.rules_data:
-        #        rule['count_broken'] = 0
-        #        rule['count_no_update'] = 0
-        # rule['count_missing'] = 0
-
-        self._create_widgets()
-        self._refresh_tree()
-
-        # 啟動引擎
-        self.engine = TaskEngine(self, self.logger)
-
-    def _create_widgets(self):
-        # 新增這行：讀取存好的寬度設定，如果沒有就給空字典
-        saved_widths = self.rules_data[0].get("ui_widths", {}) if (
-            self.rules_data and "ui_widths" in self.rules_data[0]) else {}
-
-        self.ctrl_frame = ctk.CTkFrame(self)
-        self.ctrl_frame = ctk.CTkFrame(self)
-        self.ctrl_frame.pack(fill="x", padx=10, pady=5)
-
-        # 模式設定
-        set_frame = ctk.CTkFrame(self.ctrl_frame, fg_color="transparent")
-        set_frame.pack(side="left", padx=5)
-        ctk.CTkLabel(set_frame, text="Timer模式:").pack(side="left", padx=5)
-        ctk.CTkComboBox(set_frame, values=["固定秒數", "指定分鐘"],
-                        variable=self.timer_mode, width=100).pack(side="left", padx=5)
-        ctk.CTkEntry(set_frame, textvariable=self.timer_setting,
-                     width=120).pack(side="left", padx=5)
-
-        # 按鈕群
-        btn_frame = ctk.CTkFrame(self.ctrl_frame, fg_color="transparent")
-        btn_frame.pack(side="left", padx=15)
-        ctk.CTkButton(btn_frame, text="+ 設定規則", width=90, fg_color="#28a745",
-                      command=self._add_rule_btn_click).pack(side="left", padx=5)
-        ctk.CTkButton(btn_frame, text="儲存狀態", width=90,
-                      command=self._save_all).pack(side="left", padx=5)
-
-        # 倒數計時 (修正顏色：深橘色 #D35400)
-        self.lbl_countdown = ctk.CTkLabel(self.ctrl_frame, textvariable=self.countdown_text,
-                                          font=("Arial", 15, "bold"), text_color="#D35400")
-        self.lbl_countdown.pack(side="right", padx=15)
-
-        # Treeview 表格
-        style = ttk.Style()
-        style.configure("Treeview", rowheight=28)
-
-        columns = ("id", "loc", "file", "status",
-                   "broken", "no_upd", "lost", "enable")
-        self.tree = ttk.Treeview(self, columns=columns, show="headings")
-
-        saved_widths = self.rules_data[0].get(
-            "ui_widths", {}) if self.rules_data else {}
-
-        headers = {"id": "編號", "loc": "地點", "file": "來源檔名", "status": "狀態",
-                   "broken": "破損", "no_upd": "無更新", "lost": "遺失", "enable": "啟用"}
-
-        for col, text in headers.items():
-            self.tree.heading(col, text=text)
-            # 如果 JSON 有存寬度就用 JSON 的，否則用預設值
-            w = saved_widths.get(col, 100 if len(col) > 5 else 65)
-            self.tree.column(col, width=w, anchor="center")
-
-        self.tree.pack(fill="both", expand=True, padx=10, pady=5)
-        self.tree.bind("<Double-1>", self._on_double_click)
-
-    def _refresh_tree(self):
-        """刷新表格內容：顯示本次執行數據，保留底層歷史數據"""
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-            
-        for r in self.rules_data:
-            rid = r.get("id")  # 確保取得 rid 給小帳本搜尋使用
-            
-            # 讀取小帳本中的「本次數據」
-            s_err = self.session_errors.get(rid, {"broken": 0, "no_upd": 0, "lost": 0})
-
-            # 只保留這一個 insert 動作
-            self.tree.insert("", "end", values=(
-                rid, 
-                r.get("location",""), 
-                r.get("source_filename",""),
-                r.get("status","等待"), 
-                s_err["broken"],  # 顯示小帳本：本次破損
-                s_err["no_upd"],  # 顯示小帳本：本次無更新
-                s_err["lost"],    # 顯示小帳本：本次遺失
-                "V" if r.get("enabled") else "-"
-            ))
-
-    def update_status(self, rid, status, error_type=None):
-        """當引擎發現錯誤，呼叫這裡"""
-        for r in self.rules_data:
-            if r.get("id") == rid:
-                r["status"] = status
-                
-                # [關鍵點] 如果有報錯，增加「小帳本」數值
-                if error_type and rid in self.session_errors:
-                    if error_type == "broken": self.session_errors[rid]["broken"] += 1
-                    elif error_type == "no_upd": self.session_errors[rid]["no_upd"] += 1
-                    elif error_type == "lost": self.session_errors[rid]["lost"] += 1
-                break
-        
-        # 這裡一定要刷新畫面，數字才會從 0 變 1
-        self._refresh_tree()
-
-    def handle_engine_report(self, rid, error_type):
-        """
-        [新函式] 當背景引擎發現錯誤時，必須呼叫此處！
-        error_type: "broken", "no_upd", "lost"
-        """
-        # (1) 同步更新「小帳本」(讓畫面會動)
-        if rid in self.session_errors:
-            if error_type == "broken": self.session_errors[rid]["broken"] += 1
-            elif error_type == "no_upd": self.session_errors[rid]["no_upd"] += 1
-            elif error_type == "lost": self.session_errors[rid]["lost"] += 1
-
-        # (2) 同步更新「歷史存摺」(讓 JSON 紀錄歷史)
-        for r in self.rules_data:
-            if r.get("id") == rid:
-                field_name = f"count_{error_type.replace('no_upd', 'no_update').replace('lost', 'missing')}"
-                r[field_name] = r.get(field_name, 0) + 1
-                break
-        
-        # (3) 立即刷新畫面與存檔
-        self._refresh_tree()
-        self.config_mgr.save_config(self.rules_data)
-
-    def _on_double_click(self, event):
-        selected = self.tree.selection()
-        if not selected:
-            return
-        idx = self.tree.item(selected)["values"][0]
-        RuleEditor(self, self.rules_data[idx-1], self._update_callback)
-
-    def _add_rule_btn_click(self):
-        tid = simpledialog.askinteger(
-            "設定", "輸入規則編號 (1-256):", minvalue=1, maxvalue=256)
-        if tid:
-            RuleEditor(self, self.rules_data[tid-1], self._update_callback)
-
-    def _update_callback(self, rid, data):
-        # (1) 更新小帳本 (UI 顯示用)
-        if rid in self.session_errors:
-            self.session_errors[rid]["broken"] += data.get('new_broken', 0)
-            self.session_errors[rid]["no_upd"] += data.get('new_no_upd', 0)
-            self.session_errors[rid]["lost"] += data.get('new_lost', 0)
-
-        # (2) 更新 rules_data 並處理狀態更新
-        for r in self.rules_data:
-            if r.get("id") == rid:
-                # 歷史計數累加
-                r["count_broken"] = r.get("count_broken", 0) + data.get('new_broken', 0)
-                r["count_no_update"] = r.get("count_no_update", 0) + data.get('new_no_upd', 0)
-                r["count_missing"] = r.get("count_missing", 0) + data.get('new_lost', 0)
-                
-                # 更新其他欄位 (從編輯器回傳的 data)
-                r.update(data)
-                r["enabled"] = True
-                r["status"] = "正常"
-                break
-        
-        # (3) 存檔與刷新
-        self.config_mgr.save_config(self.rules_data)
-        self._refresh_tree()
-
-    def _save_all(self):
-        """儲存目前所有規則狀態與 Treeview 欄位寬度"""
-        # 1. 抓取目前 Treeview 每個欄位的寬度
-        current_widths = {}
-        columns = ("id", "loc", "file", "status",
-                   "broken", "no_upd", "lost", "enable")
-        for col in columns:
-            current_widths[col] = self.tree.column(col, "width")
-
-        # 2. 將寬度資訊存入 rules_data 的第一筆規則中 (作為全域介面設定)
-        if self.rules_data:
-            self.rules_data[0]["ui_widths"] = current_widths
-
-        # 3. 呼叫 config_mgr 寫入 JSON
-        self.config_mgr.save_config(self.rules_data)
-
-        # 4. 記錄日誌
-        if self.logger:
-            self.logger.write_log("已儲存當前配置與欄位寬度設定。")
+import queue
+import customtkinter as ctk
+from tkinter import ttk, simpledialog
+from config_manager import ConfigManager
+from tabs.rule_editor import RuleEditor
+from task_engine import TaskEngine, TIMER_MODES
+
+PAGE_SIZE = 100  # 表格每頁列數 (可在設定檔 ui.page_size 調整)
+ROW_FILTERS = ("全部", "僅啟用", "僅異常")
+# 可點標題排序的欄位 -> 在 _row_for 回傳 tuple 中的位置
+SORT_COLUMNS = {"id": 0, "broken": 4, "no_upd": 5, "lost": 6}
+
+
+class Tab4Backup(ctk.CTkFrame):
+    def __init__(self, master, logger, **kwargs):
+        super().__init__(master, **kwargs)
+        self.logger = logger
+        self.config_mgr = ConfigManager()
+        self.rules_data = self.config_mgr.load_config()
+        for err in self.config_mgr.load_errors:
+            self.logger.write_log(f"設定檔警告: {err}")
+        # 規則 ID -> 規則物件，避免每次線性搜尋 rules_data (跟著引擎快照換)
+        self._rules_by_id = {r.id: r for r in self.rules_data}
+        self._snapshot_version = None
+        # 建立「本次開機」專用的小帳本 (Dict)，key 為規則 ID
+        self.session_errors = {
+            r.id: {"broken": 0, "no_upd": 0, "lost": 0}
+            for r in self.rules_data
+        }
+
+        # UI 變數
+        self.timer_mode = ctk.StringVar(value="固定秒數")
+        self.timer_setting = ctk.StringVar(value="10.0")
+        self.countdown_text = ctk.StringVar(value="等待啟動...")
+        self.row_filter = ctk.StringVar(value="全部")
+        self.page_text = ctk.StringVar(value="")
+
+        # 表格只放目前這一頁 (篩選、排序後) 的規則，幾千條規則也不會全部建成 Treeview item
+        self._page = 0
+        self._page_size = int(self.config_mgr.ui_settings.get("page_size", PAGE_SIZE))
+        self._sort_col = "id"
+        self._sort_desc = False
+
+        # 表格差異更新用 (只含目前頁面上的列)：規則 ID <-> Treeview item，以及每列目前顯示的值
+        self._tree_items = {}
+        self._item_rules = {}
+        self._row_values = {}
+        self._refresh_pending = False
+
+        # --- 新增：每次啟動時將計數器歸零 ---
+        # if self.rules_data:
+        #    for rule in self.rules_data:
+        #        rule['count_broken'] = 0
+        #        rule['count_no_update'] = 0
+        # rule['count_missing'] = 0
+
+        # 啟動引擎 (引擎不碰 Tk，畫面靠事件佇列輪詢更新)
+        # 規則由引擎持有：畫面只讀它發佈的快照，修改一律用 submit_edit() 排隊
+        self.engine = TaskEngine(self.rules_data, self.logger, config_mgr=self.config_mgr,
+                                 settings=self.config_mgr.engine_settings,
+                                 timer_mode=self.timer_mode.get(), timer_setting=self.timer_setting.get())
+        self._engine_events = self.engine.subscribe()
+
+        self._create_widgets()
+        self._refresh_tree()
+        self.row_filter.trace_add("write", lambda *_: self._goto_page(0))
+        self.timer_mode.trace_add("write", self._on_timer_changed)
+        self.timer_setting.trace_add("write", self._on_timer_changed)
+        self.after(200, self._poll_engine)
+
+    def _on_timer_changed(self, *_):
+        self.engine.set_timer(self.timer_mode.get(), self.timer_setting.get())
+
+    def _poll_engine(self):
+        """Tk 執行緒定時取出引擎事件：倒數文字只取最新一筆，掃描完成就刷新表格"""
+        countdown = None
+        try:
+            while True:
+                kind, payload = self._engine_events.get_nowait()
+                if kind == "countdown":
+                    countdown = payload
+                elif kind in ("scan_done", "rules_changed"):
+                    self._schedule_refresh()
+        except queue.Empty:
+            pass
+        if countdown is not None:
+            self.countdown_text.set(countdown)
+        self.after(200, self._poll_engine)
+
+    def _create_widgets(self):
+        # 新增這行：讀取存好的寬度設定，如果沒有就給空字典
+        saved_widths = self.config_mgr.ui_settings.get("widths", {})
+
+        self.ctrl_frame = ctk.CTkFrame(self)
+        self.ctrl_frame = ctk.CTkFrame(self)
+        self.ctrl_frame.pack(fill="x", padx=10, pady=5)
+
+        # 模式設定
+        set_frame = ctk.CTkFrame(self.ctrl_frame, fg_color="transparent")
+        set_frame.pack(side="left", padx=5)
+        ctk.CTkLabel(set_frame, text="Timer模式:").pack(side="left", padx=5)
+        ctk.CTkComboBox(set_frame, values=list(TIMER_MODES),
+                        variable=self.timer_mode, width=100).pack(side="left", padx=5)
+        ctk.CTkEntry(set_frame, textvariable=self.timer_setting,
+                     width=120).pack(side="left", padx=5)
+
+        # 按鈕群
+        btn_frame = ctk.CTkFrame(self.ctrl_frame, fg_color="transparent")
+        btn_frame.pack(side="left", padx=15)
+        ctk.CTkButton(btn_frame, text="+ 設定規則", width=90, fg_color="#28a745",
+                      command=self._add_rule_btn_click).pack(side="left", padx=5)
+        ctk.CTkButton(btn_frame, text="儲存狀態", width=90,
+                      command=self._save_all).pack(side="left", padx=5)
+
+        # 倒數計時 (修正顏色：深橘色 #D35400)
+        self.lbl_countdown = ctk.CTkLabel(self.ctrl_frame, textvariable=self.countdown_text,
+                                          font=("Arial", 15, "bold"), text_color="#D35400")
+        self.lbl_countdown.pack(side="right", padx=15)
+
+        # 表格篩選與分頁
+        view_frame = ctk.CTkFrame(self, fg_color="transparent")
+        view_frame.pack(fill="x", padx=10)
+        ctk.CTkLabel(view_frame, text="顯示:").pack(side="left", padx=5)
+        ctk.CTkComboBox(view_frame, values=list(ROW_FILTERS),
+                        variable=self.row_filter, width=100).pack(side="left", padx=5)
+        ctk.CTkButton(view_frame, text=">", width=30,
+                      command=lambda: self._goto_page(self._page + 1)).pack(side="right", padx=5)
+        ctk.CTkLabel(view_frame, textvariable=self.page_text).pack(side="right", padx=5)
+        ctk.CTkButton(view_frame, text="<", width=30,
+                      command=lambda: self._goto_page(self._page - 1)).pack(side="right", padx=5)
+
+        # Treeview 表格
+        style = ttk.Style()
+        style.configure("Treeview", rowheight=28)
+
+        columns = ("id", "loc", "file", "status",
+                   "broken", "no_upd", "lost", "enable")
+        self.tree = ttk.Treeview(self, columns=columns, show="headings")
+
+        self._headers = {"id": "編號", "loc": "地點", "file": "來源檔名", "status": "狀態",
+                         "broken": "破損", "no_upd": "無更新", "lost": "遺失", "enable": "啟用"}
+
+        for col, text in self._headers.items():
+            if col in SORT_COLUMNS:
+                self.tree.heading(col, text=text, command=lambda c=col: self._sort_by(c))
+            else:
+                self.tree.heading(col, text=text)
+            # 如果 JSON 有存寬度就用 JSON 的，否則用預設值
+            w = saved_widths.get(col, 100 if len(col) > 5 else 65)
+            self.tree.column(col, width=w, anchor="center")
+
+        self.tree.pack(fill="both", expand=True, padx=10, pady=5)
+        self.tree.bind("<Double-1>", self._on_double_click)
+
+    def _row_for(self, r):
+        rid = r.id  # 確保取得 rid 給小帳本搜尋使用
+
+        # 讀取小帳本中的「本次數據」
+        s_err = self.session_errors.get(rid, {"broken": 0, "no_upd": 0, "lost": 0})
+        return (
+            rid, 
+            r.location, 
+            r.source_filename,
+            r.status, 
+            s_err["broken"],  # 顯示小帳本：本次破損
+            s_err["no_upd"],  # 顯示小帳本：本次無更新
+            s_err["lost"],    # 顯示小帳本：本次遺失
+            "V" if r.enabled else "-"
+        )
+
+    def _row_visible(self, r, mode):
+        """mode 為篩選選項，由 _refresh_tree 每次刷新讀一次傳進來"""
+        if mode == "僅啟用":
+            return r.enabled
+        if mode == "僅異常":
+            return r.status == "異常"
+        return True
+
+    def _sort_by(self, col):
+        """點欄位標題排序，再點一次反向 (計數欄位第一次點就由大到小)"""
+        if self._sort_col == col:
+            self._sort_desc = not self._sort_desc
+        else:
+            self._sort_col, self._sort_desc = col, col != "id"
+        for c in SORT_COLUMNS:
+            arrow = (" ▼" if self._sort_desc else " ▲") if c == self._sort_col else ""
+            self.tree.heading(c, text=self._headers[c] + arrow)
+        self._goto_page(0)
+
+    def _goto_page(self, page):
+        self._page = max(0, page)
+        self._refresh_tree()
+
+    def _sync_snapshot(self):
+        """引擎發佈了新版快照就換掉本地參照 (快照內的規則只讀不改)"""
+        snap = self.engine.snapshot()
+        if snap.version != self._snapshot_version:
+            self._snapshot_version = snap.version
+            self.rules_data = snap.rules
+            self._rules_by_id = snap.by_id
+
+    def _refresh_tree(self):
+        """
+        刷新表格內容：篩選 + 排序後只把目前這一頁建成 Treeview item，
+        離開頁面的列刪掉、留在頁面上的列只更新顯示值有變的部分，保留選取與捲動位置
+        """
+        self._refresh_pending = False
+        self._sync_snapshot()
+        col = SORT_COLUMNS[self._sort_col]
+        mode = self.row_filter.get()  # Tk 變數讀取要經過直譯器，整批只讀一次
+        rows = [self._row_for(r) for r in self.rules_data if self._row_visible(r, mode)]
+        sign = -1 if self._sort_desc else 1
+        rows.sort(key=lambda v: (sign * v[col], v[0]))  # 同值依編號由小到大
+
+        pages = max(1, -(-len(rows) // self._page_size))
+        self._page = min(self._page, pages - 1)
+        start = self._page * self._page_size
+        page_rows = rows[start:start + self._page_size]
+        self.page_text.set(f"第 {self._page + 1} / {pages} 頁 (共 {len(rows)} 筆)")
+
+        wanted = {values[0] for values in page_rows}
+        for rid in [rid for rid in self._tree_items if rid not in wanted]:
+            iid = self._tree_items.pop(rid)
+            del self._item_rules[iid]
+            self._row_values.pop(rid, None)
+            self.tree.delete(iid)
+
+        for index, values in enumerate(page_rows):
+            rid = values[0]
+            iid = self._tree_items.get(rid)
+            if iid is None:
+                iid = self.tree.insert("", index, values=values)
+                self._tree_items[rid] = iid
+                self._item_rules[iid] = rid
+            else:
+                if self._row_values.get(rid) != values:
+                    self.tree.item(iid, values=values)
+                if self.tree.index(iid) != index:
+                    self.tree.move(iid, "", index)
+            self._row_values[rid] = values
+
+    def _schedule_refresh(self):
+        """同一輪事件內多次呼叫只刷新一次表格"""
+        if not self._refresh_pending:
+            self._refresh_pending = True
+            self.after_idle(self._refresh_tree)
+
+    def update_status(self, rid, status, error_type=None):
+        """當引擎發現錯誤，呼叫這裡"""
+        if rid in self._rules_by_id:
+            self.engine.submit_edit(rid, {"status": status})
+            
+            # [關鍵點] 如果有報錯，增加「小帳本」數值
+            if error_type and rid in self.session_errors:
+                if error_type == "broken": self.session_errors[rid]["broken"] += 1
+                elif error_type == "no_upd": self.session_errors[rid]["no_upd"] += 1
+                elif error_type == "lost": self.session_errors[rid]["lost"] += 1
+        
+        # 這裡一定要刷新畫面，數字才會從 0 變 1 (合併成一次刷新)
+        self._schedule_refresh()
+
+    def handle_engine_report(self, rid, error_type):
+        """
+        [新函式] 當背景引擎發現錯誤時，必須呼叫此處！
+        error_type: "broken", "no_upd", "lost"
+        """
+        # (1) 同步更新「小帳本」(讓畫面會動)
+        if rid in self.session_errors:
+            if error_type == "broken": self.session_errors[rid]["broken"] += 1
+            elif error_type == "no_upd": self.session_errors[rid]["no_upd"] += 1
+            elif error_type == "lost": self.session_errors[rid]["lost"] += 1
+
+        # (2) 同步更新「歷史存摺」(讓 JSON 紀錄歷史)：交給引擎套用，存檔由 config_mgr 合併延遲寫入
+        if rid in self._rules_by_id:
+            field_name = f"count_{error_type.replace('no_upd', 'no_update').replace('lost', 'missing')}"
+            self.engine.submit_edit(rid, add={field_name: 1})
+        
+        # (3) 刷新畫面
+        self._schedule_refresh()
+
+    def _on_double_click(self, event):
+        selected = self.tree.selection()
+        if not selected:
+            return
+        rid = self._item_rules.get(selected[0])
+        if rid in self._rules_by_id:
+            RuleEditor(self, self._rules_by_id[rid], self._update_callback)
+
+    def _add_rule_btn_click(self):
+        tid = simpledialog.askinteger(
+            "設定", f"輸入規則編號 (1-{self.config_mgr.max_rules}):",
+            minvalue=1, maxvalue=self.config_mgr.max_rules)
+        if tid and tid in self._rules_by_id:
+            RuleEditor(self, self._rules_by_id[tid], self._update_callback)
+
+    def _update_callback(self, rid, data):
+        # (1) 更新小帳本 (UI 顯示用)
+        if rid in self.session_errors:
+            self.session_errors[rid]["broken"] += data.get('new_broken', 0)
+            self.session_errors[rid]["no_upd"] += data.get('new_no_upd', 0)
+            self.session_errors[rid]["lost"] += data.get('new_lost', 0)
+
+        # (2) 歷史計數累加與其他欄位 (從編輯器回傳的 data) 交給引擎套用，
+        #     型別不符的欄位由引擎記錄並不套用；套用後會發 rules_changed 事件刷新畫面，並延遲存檔
+        if rid in self._rules_by_id:
+            add = {
+                "count_broken": data.pop('new_broken', 0),
+                "count_no_update": data.pop('new_no_upd', 0),
+                "count_missing": data.pop('new_lost', 0),
+            }
+            data.update(enabled=True, status="正常")
+            self.engine.submit_edit(rid, data, add)
+
+    def _save_all(self):
+        """儲存目前所有規則狀態與 Treeview 欄位寬度"""
+        # 1. 抓取目前 Treeview 每個欄位的寬度
+        current_widths = {}
+        columns = ("id", "loc", "file", "status",
+                   "broken", "no_upd", "lost", "enable")
+        for col in columns:
+            current_widths[col] = self.tree.column(col, "width")
+
+        # 2. 將寬度資訊存入設定檔的 ui 區段
+        self.config_mgr.ui_settings["widths"] = current_widths
+
+        # 3. 呼叫 config_mgr 寫入 JSON (規則用引擎最近一次交給它的完整清單，在它的鎖內讀取)
+        self.config_mgr.save_config()
+
+        # 4. 記錄日誌
+        if self.logger:
+            self.logger.write_log("已儲存當前配置與欄位寬度設定。")
@@ -1,186 +1,1361 @@
-import os
-import time
-import hashlib
-import threading
-import shutil
-from datetime import datetime
-from PIL import Image
-
-class TaskEngine:
-    def __init__(self, tab4_ui, logger):
-        self.ui = tab4_ui
-        self.logger = logger
-        self.is_running = True
-        self.last_triggered_minute = -1
-        self.next_run_time = 0
-        
-        # 啟動背景執行緒 (守護進程)
-        self.thread = threading.Thread(target=self._main_loop, daemon=True)
-        self.thread.start()
-
-    def _get_hash(self, filepath):
-        """計算檔案 MD5 (F3 關卡)"""
-        hasher = hashlib.md5()
-        try:
-            with open(filepath, 'rb') as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hasher.update(chunk)
-            return hasher.hexdigest()
-        except:
-            return "hash_error"
-
-    def _process_rule(self, rule):
-        """三關卡邏輯判定 (F1 -> F2 -> F3)"""
-        src_path = os.path.join(rule['source_dir'], rule['source_filename'])
-        
-        # --- F1: 檔案存在檢查 ---
-        if not os.path.exists(src_path):
-            rule['count_missing'] += 1
-            rule['status'] = "異常"  # 標註異常
-            self._handle_restore(rule)
-            return
-
-        try:
-            # --- F2: 結構完整檢查 ---
-            with Image.open(src_path) as img:
-                img.verify()
-            
-            # --- F3: 內容變化檢查 ---
-            current_hash = self._get_hash(src_path)
-            if current_hash == rule['last_hash']:
-                rule['count_no_update'] += 1
-                rule['status'] = "異常"  # 標註異常
-                self._handle_restore(rule)
-                return
-            
-            # --- 合格路徑 ---
-            rule['last_hash'] = current_hash
-            rule['status'] = "正常"  # 通過檢查
-            self._save_images(rule, src_path)
-
-        except Exception:
-            rule['count_broken'] += 1
-            rule['status'] = "異常"  # 標註異常
-            self._handle_restore(rule)
-
-    def _save_images(self, rule, src_path):
-        """生成備份檔 -o 與 -s"""
-        out_dir = rule['output_dir']
-        if not os.path.exists(out_dir): os.makedirs(out_dir)
-        
-        base_name = os.path.splitext(rule['source_filename'])[0]
-        
-        try:
-            with Image.open(src_path) as img:
-                # 儲存原始尺寸檔 (-o)
-                img.save(os.path.join(out_dir, f"{base_name}-o.jpg"))
-                
-                # 儲4儲存縮放檔 (-s)
-                img_s = img.resize((rule['target_x'], rule['target_y']))
-                img_s.save(os.path.join(out_dir, f"{base_name}-s.jpg"))
-                
-            self.logger.write_log(f"規則 {rule['id']} ({rule['location']}) 檢查通過，備份完成。")
-        except Exception as e:
-            self.logger.write_log(f"規則 {rule['id']} 儲存失敗: {e}")
-
-    def _handle_restore(self, rule):
-        """執行還原：從 output_dir 搬移到 restore_dir"""
-        # 計算總異常次數
-        total_errors = rule['count_broken'] + rule['count_no_update'] + rule['count_missing']
-        
-        # 決定還原目的地 (如果沒設 restore_dir，就用來源目錄或輸出目錄)
-        restore_dest = rule.get('restore_dir') or rule['output_dir']
-        if not os.path.exists(restore_dest): os.makedirs(restore_dest)
-
-        base_name = os.path.splitext(rule['source_filename'])[0]
-        
-        # 奇數次還原 -s, 偶數次還原 -o
-        restore_suffix = "-s.jpg" if total_errors % 2 != 0 else "-o.jpg"
-        source_file = os.path.join(rule['output_dir'], f"{base_name}{restore_suffix}")
-        target_file = os.path.join(restore_dest, f"{base_name}.jpg")
-
-        if os.path.exists(source_file):
-            shutil.copy(source_file, target_file)
-            self.logger.write_log(f"規則 {rule['id']} 異常! 已還原備份檔 {restore_suffix} 至目的地。")
-        else:
-            self.logger.write_log(f"規則 {rule['id']} 嚴重錯誤: 找不到備份檔可還原。")
-
-    def _main_loop(self):
-        """計時器核心循環"""
-        while self.is_running:
-            mode = self.ui.timer_mode.get()
-            setting = self.ui.timer_setting.get()
-            now = time.time()
-
-            if mode == "固定秒數":
-                try:
-                    interval = float(setting)
-                    if self.next_run_time == 0: self.next_run_time = now + interval
-                    
-                    remaining = self.next_run_time - now
-                    if remaining <= 0:
-                        self._trigger_scan()
-                        self.next_run_time = now + interval
-                    else:
-                        self.ui.countdown_text.set(f"下次掃描倒數: {int(remaining)} 秒")
-                except: pass
-
-            elif mode == "指定分鐘":
-                try:
-                    target_minutes = [int(m.strip()) for m in setting.split(',')]
-                    curr_time = datetime.now()
-                    curr_min = curr_time.minute
-                    
-                    if curr_min in target_minutes and curr_min != self.last_triggered_minute:
-                        self._trigger_scan()
-                        self.last_triggered_minute = curr_min
-                    
-                    self.ui.countdown_text.set(f"定時掃描: {setting} 分")
-                except: pass
-
-            time.sleep(1)
-
-    def _trigger_scan(self):
-        """全域掃描動作"""
-        self.logger.write_log(">>> [全域輪詢啟動] <<<")
-        for rule in self.ui.rules_data:
-            if rule['enabled'] and rule['source_filename']:
-                self._process_rule(rule)
-        
-        # 掃描完後，叫 UI 更新畫面
-        self.ui.after(0, self.ui._refresh_tree)
-
-    def check_file(self, rule):
-        rid = rule.get("id")
-        base_path = rule.get("location")
-        file_name = rule.get("source_filename")
-        
-        # 1. 自動識別副檔名 (錨點：支援 PNG/JPG)
-        # 如果使用者寫 filename.jpg 但實際是 .png，或者反之
-        exts = ['', '.jpg', '.png', '.JPG', '.PNG']
-        target_path = None
-        for ext in exts:
-            temp_path = os.path.join(base_path, file_name + ext if not file_name.endswith(ext) else file_name)
-            if os.path.exists(temp_path):
-                target_path = temp_path
-                break
-
-        # 將原本的 self.main_app.tab4 改為：
-        #if hasattr(self.main_app, 'tab4_ref'):
-        #    self.main_app.tab4_ref.update_status(rid, "遺失", "lost")
-        #return
-
-        # 2. 檢查檔案是否損壞 (模擬邏輯)
-        if os.path.getsize(target_path) == 0:
-            self.main_app.tab4.update_status(rid, "損壞", "broken")
-        else:
-            self.main_app.tab4.update_status(rid, "正常")
-        
-        # 假設你判定檔案遺失了
-        if not os.path.exists(target_path):
-        # [精確跳線]：呼叫 Tab4 的接收端，並傳入對應的錯誤類型
-            if hasattr(self.main_app, 'tab4_ref'):
-            # 傳入 "lost" 會讓計數器的「遺失」欄位 +1
-                self.main_app.tab4_ref.update_status(rid, "遺失", "lost")
-
-
+import io
+import asyncio
+import copy
+import os
+import sys
+import json
+import math
+import mmap
+import time
+import heapq
+import queue
+import hashlib
+import argparse
+import cProfile
+import threading
+import zlib
+import shutil
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+from scan_metrics import ScanMetrics
+from result_cache import ResultCache
+from history_store import HistoryStore
+from rule_model import VARIANT_FORMATS
+
+Image = None  # PIL 延遲載入：第一次處理影像時才 import，headless 啟動不必等它
+
+try:
+    import xxhash  # 選用套件，有安裝才能用 xxh64 / xxh3_64
+except ImportError:
+    xxhash = None
+
+# 引擎預設參數 (可由 settings 覆寫)
+DEFAULT_SETTINGS = {
+    "scan_workers": 1,      # 平行掃描執行緒數，1 = 原本的逐條掃描 (預設)，>1 開啟平行模式
+    "share_limit": 2,       # 同一個分享 (磁碟機 / NAS 主機) 同時處理的規則上限
+    "rule_timeout": 30.0,   # 單條規則逾時秒數 (平行模式)，逾時就先放掉不等
+    "mmap_local": False,    # 本機磁碟來源改用 mmap 讀取 (UNC 網路路徑一律整檔讀入)
+    "stat_fast_path": False,  # F3 快速路徑：mtime/大小/inode 都沒變就直接判定無更新
+    "full_hash_every": 10,    # 快速路徑下，每 N 輪仍強制完整讀檔比對一次
+    "hash_algo": "blake2b",   # F3 雜湊演算法: blake2b / md5 / sha1 / xxh64 / xxh3_64
+    "o_transcode": False,     # PNG/BMP 來源的 -o 是否轉成 JPEG (預設保留原格式原樣複製)
+    "o_quality": 95,          # -o 轉 JPEG 時的品質
+    "reducing_gap": 2.0,      # 縮圖先整數倍 reduce 再精細重取樣，None = 關閉
+    "watch_debounce": 2.0,    # 監看模式：檔案最後一次變動後靜止幾秒才處理 (避免讀到寫一半的檔)
+    "watch_poll_interval": 2.0,  # 監看模式：不支援事件通知的目錄輪詢間隔
+    "backoff_max": 3600.0,    # 個別排程：連續異常退避後的最長間隔 (秒)
+    "metrics_export": "",     # 指標匯出檔路徑，空字串 = 不匯出
+    "metrics_format": "json",  # json / prometheus
+    "metrics_export_every": 60.0,  # 匯出間隔 (秒)
+    "profile_next_scan": "",  # 指定路徑時，下一次全域掃描用 cProfile 剖析並輸出到該檔
+    "restore_link": False,    # 還原時同一檔案系統改用硬連結 (不複製資料)；目的地被別的程式原地改寫會連備份一起改到
+    "scan_processes": 0,      # >0 時把規則分片給多個子行程掃描 (解碼 / 編碼不受 GIL 限制)，0 = 關閉
+    "shard_by": "source_dir",  # 分片依據: source_dir (同一目錄在同一子行程) / id
+    "async_scan": False,      # asyncio 掃描：檔案操作丟到執行緒池，每個分享各自限流、探測逾時
+    "io_timeout": 5.0,        # asyncio 掃描：探測來源的逾時秒數，逾時的分享本輪視為遺失
+    "cache_mb": 64,           # 結果快取上限 (MB)：同內容的驗證結果與 -s / -o 編碼不重做，0 = 關閉
+    "min_source_bytes": 256,  # F2：小於此大小的來源直接判定破損
+    "history_depth": 0,       # 每條規則在 {output_dir}/.history 保留幾張通過檢查的畫面，0 = 關閉
+    "history_max_age_days": 30.0,  # 歷史畫面保留天數 (每條規則最新一張不受限)
+    "history_max_mb": 2048,   # 每個輸出目錄的歷史總大小上限 (MB)
+}
+
+TIMER_MODES = ("固定秒數", "指定分鐘", "監看變更", "個別排程")
+
+HASH_BUF_SIZE = 1024 * 1024  # 檔案雜湊時每次 readinto 的緩衝大小
+JPEG_MAGIC = b"\xff\xd8\xff"
+JPEG_EOI = b"\xff\xd9"
+PNG_MAGIC = b"\x89PNG\r\n\x1a\n"
+PNG_IEND = b"IEND\xaeB`\x82"  # IEND chunk 型別 + 固定 CRC
+TAIL_SCAN = 64 * 1024  # F2 第一層只看緩衝最後這麼多位元組
+ORIG_EXTS = (".jpg", ".png", ".bmp")  # -o 備份可能的副檔名
+
+RESAMPLE_FILTERS = ("nearest", "box", "bilinear", "hamming", "bicubic", "lanczos")
+
+# 引擎發佈的規則快照：發佈後不再修改，GUI / 設定檔寫入可以直接讀 (by_id: 規則 ID -> 規則)
+RuleSnapshot = namedtuple("RuleSnapshot", "version rules by_id")
+
+# 子行程掃描後要傳回協調者的規則欄位 (其餘欄位只有 GUI / 設定檔會改)
+SCAN_STATE_FIELDS = ("status", "count_broken", "count_no_update", "count_missing",
+                     "last_hash", "last_stat", "last_restore")
+
+
+class BrokenFrame(ValueError):
+    """畫面通過標記檢查但解碼失敗：當作破損處理 (計數、還原)，不寫任何備份"""
+
+
+def _pil():
+    global Image
+    if Image is None:
+        from PIL import Image as pil_image
+        Image = pil_image
+    return Image
+
+
+def fit_size(src_size, target_size, fit="stretch"):
+    """計算縮圖尺寸：stretch 直接拉到目標大小，contain 保持比例塞進目標框內"""
+    if fit != "contain":
+        return target_size
+    w, h = src_size
+    scale = min(target_size[0] / w, target_size[1] / h)
+    return max(1, round(w * scale)), max(1, round(h * scale))
+
+
+def quick_integrity(data, min_bytes=0):
+    """
+    F2 第一層：只看已讀入緩衝的開頭與結尾，不解碼。
+    回傳 (結果, 原因)，結果為 "ok" / "broken" / "unknown" (要完整解碼才能確定)。
+    相機常見的「上傳到一半」會少掉 JPEG EOI / PNG IEND，這一層就能抓到。
+    """
+    size = len(data)
+    if size < min_bytes:
+        return "broken", f"檔案過小 ({size} bytes)"
+    head = data[:8]
+    if head[:3] == JPEG_MAGIC or head == PNG_MAGIC:
+        tail = data[-TAIL_SCAN:]
+        end, name = (JPEG_EOI, "JPEG EOI") if head[:3] == JPEG_MAGIC else (PNG_IEND, "PNG IEND")
+        if tail.rstrip(b"\x00\xff").endswith(end):  # 容許結尾的 0x00 / 0xFF 填充
+            return "ok", ""
+        if end in tail:
+            return "unknown", f"{name} 之後還有資料"
+        return "broken", f"缺少 {name}，檔案可能寫到一半"
+    if head[:2] == b"BM" and size >= 6:
+        declared = int.from_bytes(data[2:6], "little")
+        if declared > size:
+            return "broken", f"BMP 不完整 (標頭 {declared} bytes，實際 {size} bytes)"
+        return ("ok" if declared == size else "unknown"), ""
+    return "unknown", "非 JPEG / PNG / BMP"
+
+
+def make_thumbnail(img, target_size, fit="stretch", resample="bicubic", reducing_gap=2.0):
+    """產生 -s 縮圖：JPEG 先用 draft() 以 DCT 縮放解碼到夠用的最小尺寸，再 resize (已 draft 過的圖不會再縮)"""
+    size = fit_size(img.size, target_size, fit)
+    img.draft(None, size)  # 只對尚未解碼的 JPEG 有效，其他格式不做事
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    pil = _pil()
+    resampling = getattr(pil, "Resampling", pil)  # Pillow < 9.1 沒有 Resampling 列舉
+    name = resample if resample in RESAMPLE_FILTERS else "bicubic"
+    return img.resize(size, getattr(resampling, name.upper()), reducing_gap=reducing_gap)
+
+
+class TaskEngine:
+    """
+    掃描 / 還原引擎，不依賴 Tk：規則清單與 config_mgr 直接傳入。
+    GUI 透過 subscribe() 取得事件佇列當觀察者，用 set_timer() 改計時設定。
+    規則採 copy-on-write：每輪掃描改的是副本，掃完整批發佈成新版快照 (snapshot())；
+    GUI 的修改用 submit_edit() 排隊，由引擎執行緒套用，雙方都不用等對方也不會讀到改到一半的規則。
+    """
+    def __init__(self, rules, logger, config_mgr=None, settings=None,
+                 timer_mode="固定秒數", timer_setting="10.0", start=True):
+        self._snapshot = RuleSnapshot(0, tuple(rules), {r.id: r for r in rules})
+        self._edits = queue.SimpleQueue()  # (規則 ID, 欄位變更, 計數增量)
+        self.logger = logger
+        self.config_mgr = config_mgr
+        self.settings = dict(DEFAULT_SETTINGS)
+        for key, value in (settings or {}).items():
+            if key in DEFAULT_SETTINGS:
+                self.settings[key] = value
+            else:
+                self.logger.write_log(f"未知的引擎參數 {key}，已忽略。")
+        self.hash_algo = self._resolve_hash_algo(self.settings["hash_algo"])
+        self.is_running = True
+        self.last_triggered_minute = -1
+        self.next_run_time = 0
+
+        # 計時設定 (GUI 改變時呼叫 set_timer，背景執行緒只讀這兩個字串)
+        self.timer_mode = timer_mode
+        self.timer_setting = timer_setting
+
+        # 觀察者事件佇列：("countdown", 文字) / ("scan_done", 規則 ID 清單)
+        self._subscribers = []
+        self._subscribers_lock = threading.Lock()
+
+        # 平行掃描用的執行緒池與各分享的併發閘門 (第一次平行掃描時才建立)
+        self._pool = None
+        self._pool_size = 0
+        self._proc_pool = None      # 多行程分片掃描用 (scan_processes > 0 時才建立)
+        self._proc_pool_size = 0
+        self._share_locks = {}
+        self._share_locks_guard = threading.Lock()
+        self._stuck_probes = {}     # asyncio 掃描：分享 -> 逾時仍未返回的探測執行緒
+        self._stuck_work = []       # 逾時仍在執行緒池裡跑的工作 (下一輪換新的執行緒池)
+
+        # 掃描指標 (各階段耗時、結果計數、讀寫位元組數)
+        self.metrics = ScanMetrics()
+        self._last_export = 0
+
+        # 依內容雜湊快取的處理結果 (多條規則指向同一來源、或同內容跨輪時重用)
+        cache_bytes = int(float(self.settings["cache_mb"]) * 1024 * 1024)
+        self.cache = ResultCache(cache_bytes) if cache_bytes > 0 else None
+
+        # 備份歷史：輸出目錄 -> HistoryStore (第一次用到時才載入索引)
+        self._histories = {}
+        self._histories_lock = threading.Lock()
+
+        # 快速路徑連續略過完整比對的輪數，key 為規則 ID
+        self._stat_skips = {}
+
+        # 每個執行緒各自一塊可重複使用的讀檔緩衝
+        self._local = threading.local()
+
+        # 監看模式：watcher 與尚在防抖等待中的變動 ((目錄, 檔名) -> 最後變動時間)
+        self._watcher = None
+        self._changed = {}
+        self._changed_lock = threading.Lock()
+        self.next_sweep_time = 0
+
+        # 個別排程：heap 內放 (到期時間, 規則 ID)，_sched_due 記錄每條規則目前有效的到期時間
+        self._sched_heap = []
+        self._sched_due = {}
+        self._sched_sig = {}     # 規則 ID -> (interval, schedule_minutes)，偵測規則被編輯
+        self._sched_streak = {}  # 規則 ID -> 連續「遺失 / 無更新」次數 (退避用)
+        
+        # 啟動背景執行緒 (守護進程)
+        self.thread = threading.Thread(target=self._main_loop, daemon=True)
+        if start:
+            self.thread.start()
+
+    def set_timer(self, mode, setting):
+        """由 GUI (或其他呼叫端) 更新計時模式與設定值"""
+        if (mode, setting) != (self.timer_mode, self.timer_setting):
+            self.timer_mode, self.timer_setting = mode, setting
+            self.next_run_time = 0
+
+    def subscribe(self):
+        """註冊觀察者，回傳一個執行緒安全的事件佇列；沒人訂閱時不會累積事件"""
+        events = queue.SimpleQueue()
+        with self._subscribers_lock:
+            self._subscribers.append(events)
+        return events
+
+    def _publish(self, kind, payload=None):
+        with self._subscribers_lock:
+            for events in self._subscribers:
+                events.put((kind, payload))
+
+    def snapshot(self):
+        """目前發佈中的規則快照 (唯讀)"""
+        return self._snapshot
+
+    def submit_edit(self, rule_id, changes=None, add=None):
+        """
+        送出規則修改：changes 為欄位新值 (經 Rule.update 驗證)，add 為計數欄位增量。
+        任何執行緒都可呼叫，引擎在下一次主循環或本輪掃描結束時套用並發佈新快照。
+        """
+        self._edits.put((rule_id, changes or {}, add or {}))
+
+    def _apply_edits(self, work):
+        """把排隊中的修改套到 work (規則 ID -> 可修改的副本)"""
+        by_id = self._snapshot.by_id
+        while True:
+            try:
+                rid, changes, add = self._edits.get_nowait()
+            except queue.Empty:
+                return
+            rule = work.get(rid)
+            if rule is None:
+                if rid not in by_id:
+                    self.logger.write_log(f"規則 {rid} 不存在，忽略修改。")
+                    continue
+                rule = work[rid] = copy.copy(by_id[rid])
+            for err in rule.update(changes):
+                self.logger.write_log(err)
+            for key, n in add.items():
+                setattr(rule, key, getattr(rule, key) + n)
+
+    def _commit(self, work):
+        """以 work 內的副本取代舊規則，發佈新版快照 (舊快照內的物件不再被修改)"""
+        if not work:
+            return
+        snap = self._snapshot
+        rules = tuple(work.get(r.id, r) for r in snap.rules)
+        self._snapshot = RuleSnapshot(snap.version + 1, rules, {r.id: r for r in rules})
+        # 有變動的規則交給 config_mgr 延遲合併寫入
+        if self.config_mgr is not None:
+            self.config_mgr.mark_dirty(list(work.values()), all_rules=rules)
+
+    def _drain_edits(self):
+        """掃描之間套用 GUI 送來的修改"""
+        work = {}
+        self._apply_edits(work)
+        if work:
+            self._commit(work)
+            self._publish("rules_changed", list(work))
+
+    def stop(self):
+        self.is_running = False
+        # 等主循環收尾 (套用排隊中的修改)；正在掃描時不久等，避免關閉視窗卡住
+        if self.thread.is_alive() and threading.current_thread() is not self.thread:
+            self.thread.join(timeout=2)
+        if self._proc_pool is not None:
+            self._proc_pool.shutdown(wait=False, cancel_futures=True)
+            self._proc_pool = None
+
+    def _resolve_hash_algo(self, algo):
+        """確認演算法可用；xxhash 沒裝或名稱不支援就退回 blake2b (設定打錯不該讓程式起不來)"""
+        if algo.startswith("xxh") and (xxhash is None or not hasattr(xxhash, algo)):
+            self.logger.write_log(f"雜湊演算法 {algo} 無法使用 (未安裝 xxhash)，改用 blake2b。")
+            return "blake2b"
+        try:
+            self._new_hasher(algo).hexdigest()  # shake_* 這類要指定長度的也算不支援
+        except (ValueError, TypeError):
+            self.logger.write_log(f"雜湊演算法 {algo} 不支援，改用 blake2b。")
+            return "blake2b"
+        return algo
+
+    def _new_hasher(self, algo):
+        if algo.startswith("xxh"):
+            if xxhash is None or not hasattr(xxhash, algo):
+                raise ValueError(f"unsupported hash algorithm: {algo}")
+            return getattr(xxhash, algo)()
+        if algo == "blake2b":
+            return hashlib.blake2b(digest_size=16)
+        return hashlib.new(algo)
+
+    def _hash_bytes(self, data, algo=None):
+        """計算緩衝內容的雜湊，回傳帶演算法前綴的字串，例如 blake2b:xxxx"""
+        algo = algo or self.hash_algo
+        hasher = self._new_hasher(algo)
+        hasher.update(data)
+        return f"{algo}:{hasher.hexdigest()}"
+
+    def _get_hash(self, filepath, algo=None):
+        """計算檔案雜湊 (大緩衝 readinto)，讀檔錯誤直接往上丟"""
+        algo = algo or self.hash_algo
+        hasher = self._new_hasher(algo)
+        buf = getattr(self._local, "buf", None)
+        if buf is None:
+            buf = self._local.buf = bytearray(HASH_BUF_SIZE)
+        view = memoryview(buf)
+        with open(filepath, 'rb') as f:
+            while True:
+                n = f.readinto(buf)
+                if not n:
+                    break
+                hasher.update(view[:n])
+        return f"{algo}:{hasher.hexdigest()}"
+
+    def _same_content(self, data, current_hash, last_hash):
+        """F3 比對：舊版 config 的 last_hash 沒有前綴，視為 MD5 重新計算後比較"""
+        if not last_hash:
+            return False
+        algo, sep, _ = last_hash.partition(":")
+        if not sep:
+            algo, last_hash = "md5", f"md5:{last_hash}"
+        if algo == self.hash_algo:
+            return current_hash == last_hash
+        try:
+            return self._hash_bytes(data, algo) == last_hash
+        except ValueError:
+            # 舊雜湊的演算法在這台機器上不可用，當作內容已變
+            return False
+
+    def _read_source(self, src_path):
+        """來源檔只讀一次：整檔讀入記憶體，本機磁碟可改用 mmap"""
+        with open(src_path, 'rb') as f:
+            if self.settings["mmap_local"] and not self._is_network_path(src_path):
+                try:
+                    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except (ValueError, OSError):
+                    # 空檔或不支援 mmap 的檔案系統，退回一般讀取
+                    f.seek(0)
+            data = f.read()
+        return data
+
+    def _is_network_path(self, path):
+        return path.startswith(("\\\\", "//"))
+
+    def _open_buffer(self, data):
+        """把讀入的緩衝包成 PIL 可開啟的檔案物件 (不複製內容)"""
+        if isinstance(data, mmap.mmap):
+            data.seek(0)
+            return data
+        return io.BytesIO(data)
+
+    def _process_rule(self, rule):
+        """三關卡邏輯判定 (F1 -> F2 -> F3)"""
+        started = time.perf_counter()
+        src_path = os.path.join(rule.source_dir, rule.source_filename)
+        
+        # --- F1: 檔案存在檢查 (順便取得 stat 給 F3 快速路徑) ---
+        try:
+            with self.metrics.stage("exists"):
+                st = os.stat(src_path)
+        except OSError:
+            rule.count_missing += 1
+            rule.status = "異常"  # 標註異常
+            self._handle_restore(rule, "missing", started)
+            return
+
+        # --- F3 快速路徑: 檔案屬性完全沒變，不讀檔直接判定無更新 ---
+        stat_key = [st.st_mtime_ns, st.st_size, st.st_ino]
+        if self.settings["stat_fast_path"] and rule.last_stat == stat_key:
+            skips = self._stat_skips.get(rule.id, 0) + 1
+            if skips < self.settings["full_hash_every"]:
+                self._stat_skips[rule.id] = skips
+                rule.count_no_update += 1
+                rule.status = "異常"  # 標註異常
+                self._handle_restore(rule, "no_update", started)
+                return
+        self._stat_skips[rule.id] = 0
+
+        data = None
+        try:
+            with self.metrics.stage("read"):
+                data = self._read_source(src_path)
+            self.metrics.add_bytes(read=len(data))
+
+            # --- F2 第一層: 開頭 / 結尾標記與大小下限 (只看緩衝，不解碼) ---
+            with self.metrics.stage("verify"):
+                verdict, reason = quick_integrity(data, int(self.settings["min_source_bytes"]))
+            if verdict == "broken":
+                raise ValueError(reason)
+
+            with self.metrics.stage("hash"):
+                current_hash = self._hash_bytes(data)
+
+            # --- F2 第二層: 判斷不了或規則要求嚴格驗證時才完整解碼 (同內容解碼過就不再做) ---
+            if (verdict != "ok" or rule.strict) and self._cache_get((current_hash, "verify")) is None:
+                with self.metrics.stage("verify"), _pil().open(self._open_buffer(data)) as img:
+                    img.load()
+                self._cache_put((current_hash, "verify"), True, size=64)
+            
+            # --- F3: 內容變化檢查 ---
+            rule.last_stat = stat_key
+            if self._same_content(data, current_hash, rule.last_hash):
+                rule.last_hash = current_hash  # 順便換成新演算法的雜湊
+                rule.count_no_update += 1
+                rule.status = "異常"  # 標註異常
+                self._handle_restore(rule, "no_update", started)
+                return
+            
+            # --- 合格路徑: 備份成功才記下雜湊，失敗的話下一輪會重新處理 ---
+            if self._save_images(rule, data, started, current_hash):
+                rule.last_hash = current_hash
+                rule.status = "正常"  # 通過檢查
+            else:
+                rule.last_stat = None
+                rule.status = "異常"  # 標註異常
+
+        except Exception as e:
+            # 破損檔不留 stat，避免下一輪被快速路徑誤判成「無更新」
+            rule.last_stat = None
+            rule.count_broken += 1
+            rule.status = "異常"  # 標註異常
+            self._handle_restore(rule, "broken", started, reason=str(e))
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+    def _log_fields(self, rule, outcome, started):
+        """規則處理結束：記錄結果與總耗時指標，並回傳寫進落地紀錄檔的結構化欄位"""
+        self.metrics.count_outcome(outcome)
+        fields = {"rule": rule.id, "outcome": outcome}
+        if started is not None:
+            elapsed = time.perf_counter() - started
+            self.metrics.observe("rule", elapsed)
+            fields["duration_ms"] = round(elapsed * 1000, 1)
+        return fields
+
+    def _cache_get(self, key):
+        if self.cache is None:
+            return None
+        value = self.cache.get(key)
+        self.metrics.count_cache(value is not None)
+        return value
+
+    def _cache_put(self, key, value, size=None):
+        if self.cache is not None:
+            self.cache.put(key, value, size)
+
+    def _cached_bytes(self, key, encode):
+        """key 以內容雜湊開頭；快取沒有才呼叫 encode() 解碼 / 縮圖 / 編碼"""
+        if not key[0]:
+            return encode()
+        value = self._cache_get(key)
+        if value is None:
+            value = encode()
+            self._cache_put(key, value)
+        return value
+
+    def _render_outputs(self, rule, data, content_hash=""):
+        """
+        在記憶體產生所有備份檔：回傳 ([(檔名, 位元組)], 歷史用副檔名)，-o 在最前面。
+        縮圖變體由大到小，每張從上一張縮小，原圖只解碼一次；
+        PIL 開檔只讀標頭，全部快取命中 (同內容先前已成功處理) 時完全不解碼。
+        """
+        base_name = os.path.splitext(rule.source_filename)[0]
+        outputs = []
+        with _pil().open(self._open_buffer(data)) as img:
+            # -o：JPEG 直接用原始位元組，不重新壓縮
+            orig_ext = ".jpg" if data[:3] == JPEG_MAGIC else "." + (img.format or "png").lower()
+            if data[:3] != JPEG_MAGIC and self.settings["o_transcode"]:
+                quality = self.settings["o_quality"]
+                orig = self._cached_bytes(
+                    (content_hash, "o_jpeg", quality),
+                    lambda: self._encode_jpeg(self._jpeg_ready(img), quality))
+                outputs.append((f"{base_name}-o.jpg", orig))
+            else:
+                outputs.append((f"{base_name}-o{orig_ext}", data))
+
+            # JPEG 只 draft 一次，縮到所有變體的外框 (寬、高各取最大)：
+            # 若照第一個變體 draft，後面較寬或較高的變體就得從更小的圖放大
+            variants = rule.output_variants()
+            sizes = [fit_size(img.size, tuple(v["size"]), rule.fit) for v in variants]
+            if sizes:
+                img.draft(None, (max(w for w, _ in sizes), max(h for _, h in sizes)))
+
+            prev = None
+            for variant, (out_w, out_h) in zip(variants, sizes):
+                size = tuple(variant["size"])
+                fmt, quality = variant["format"], variant["quality"] or None
+                key = (content_hash, "thumb", size, rule.fit, rule.resample, fmt, quality)
+                encoded = self._cache_get(key) if content_hash else None
+                if encoded is None:
+                    src = prev if prev is not None and prev.width >= out_w and prev.height >= out_h else img
+                    prev = make_thumbnail(src, size, fit=rule.fit, resample=rule.resample,
+                                          reducing_gap=self.settings["reducing_gap"])
+                    encoded = self._encode_image(prev, fmt, quality)
+                    if content_hash:
+                        self._cache_put(key, encoded)
+                outputs.append((f"{base_name}{variant['suffix']}{VARIANT_FORMATS[fmt]}", encoded))
+        return outputs, orig_ext
+
+    def _save_images(self, rule, data, started=None, content_hash=""):
+        """
+        生成備份檔 -o 與各縮圖變體 (預設只有 -s)，成功回傳 True、寫檔失敗回傳 False。
+        先全部解碼 / 編碼完才開始寫檔：畫面解不開時丟 BrokenFrame (走破損流程)，不會蓋掉舊備份。
+        """
+        out_dir = rule.output_dir
+        try:
+            with self.metrics.stage("encode"):
+                outputs, orig_ext = self._render_outputs(rule, data, content_hash)
+        except Exception as e:
+            raise BrokenFrame(f"無法解碼: {e}") from e
+
+        try:
+            os.makedirs(out_dir, exist_ok=True)
+            with self.metrics.stage("write"):
+                for name, payload in outputs:
+                    self._write_bytes(os.path.join(out_dir, name), payload)
+            # 全部寫完才記進歷史，歷史裡只有完整處理過的畫面
+            history = self._history(out_dir)
+            if history is not None and content_hash:
+                history.add(rule.id, content_hash, data, orig_ext)
+
+            self.logger.write_log(f"規則 {rule.id} ({rule.location}) 檢查通過，備份完成。",
+                                  **self._log_fields(rule, "ok", started))
+            return True
+        except Exception as e:
+            self.logger.write_log(f"規則 {rule.id} 儲存失敗: {e}",
+                                  **self._log_fields(rule, "save_failed", started))
+            return False
+
+    def _history(self, out_dir):
+        """取得輸出目錄的歷史庫；history_depth 為 0 時回傳 None"""
+        depth = int(self.settings["history_depth"])
+        if depth <= 0:
+            return None
+        key = os.path.normcase(os.path.abspath(out_dir))
+        with self._histories_lock:
+            store = self._histories.get(key)
+            if store is None:
+                store = HistoryStore(os.path.join(out_dir, ".history"), depth,
+                                     max_age=float(self.settings["history_max_age_days"]) * 86400,
+                                     max_bytes=int(float(self.settings["history_max_mb"]) * 1024 * 1024))
+                self._histories[key] = store
+        return store
+
+    def _staging_path(self, path):
+        """同目錄下的暫存檔名 (同一檔案系統才能 os.replace 原子替換)"""
+        folder, name = os.path.split(path)
+        return os.path.join(folder, f".{name}.{os.getpid()}-{threading.get_ident()}.tmp")
+
+    def _write_bytes(self, path, data):
+        """寫到暫存檔再 os.replace：讀取端不會看到寫一半的 JPEG，也不會改到已硬連結出去的還原檔"""
+        tmp_path = self._staging_path(path)
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self.metrics.add_bytes(written=len(data))
+
+    def _same_dir(self, a, b):
+        return os.path.normcase(os.path.abspath(a)) == os.path.normcase(os.path.abspath(b or "."))
+
+    def _restore_file(self, rule, source_file, target_file):
+        """
+        還原單一檔案，回傳 "same" (內容相同略過) / "link" (硬連結) / "copy" (複製)。
+        rule.last_restore 記錄上次還原的來源 stat、內容雜湊與目的地 stat：
+        目的地沒被動過、備份內容也相同就不再寫；需要寫時一律先放暫存檔再原子替換。
+        """
+        src_st = os.stat(source_file)
+        src_stat = [src_st.st_size, src_st.st_mtime_ns]
+        try:
+            dst_st = os.stat(target_file)
+        except OSError:
+            dst_st = None
+
+        last = rule.last_restore or {}
+        src_hash = None
+        if last.get('src') == source_file and last.get('src_stat') == src_stat:
+            src_hash = last.get('hash')
+
+        if dst_st is not None:
+            if (dst_st.st_dev, dst_st.st_ino) == (src_st.st_dev, src_st.st_ino):
+                return "same"  # 目的地就是備份檔本身的硬連結
+            if last.get('dest_stat') == [dst_st.st_size, dst_st.st_mtime_ns, dst_st.st_ino]:
+                src_hash = src_hash or self._get_hash(source_file)
+                if src_hash == last.get('hash'):
+                    rule.last_restore = dict(last, src=source_file, src_stat=src_stat)
+                    return "same"
+
+        tmp_path = self._staging_path(target_file)
+        how = "copy"
+        try:
+            # 目的地就是相機的上傳目錄時一律複製：上傳原地覆寫會改到共用 inode 的備份
+            if self.settings["restore_link"] and not self._same_dir(os.path.dirname(target_file), rule.source_dir):
+                try:
+                    os.link(source_file, tmp_path)
+                    how = "link"
+                except OSError:
+                    pass  # 跨磁碟 / 檔案系統不支援，改用複製
+            if how == "copy":
+                shutil.copyfile(source_file, tmp_path)
+                self.metrics.add_bytes(written=src_st.st_size)
+            os.replace(tmp_path, target_file)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        dst_st = os.stat(target_file)
+        rule.last_restore = {
+            "src": source_file, "src_stat": src_stat,
+            "hash": src_hash or self._get_hash(source_file),
+            "dest_stat": [dst_st.st_size, dst_st.st_mtime_ns, dst_st.st_ino],
+        }
+        return how
+
+    def _encode_jpeg(self, img, quality=None):
+        """編碼成 JPEG 位元組 (先在記憶體編碼，寫檔與位元組計數一起處理)"""
+        return self._encode_image(img, "jpeg", quality)
+
+    def _encode_image(self, img, fmt, quality=None):
+        """編碼成 JPEG / WebP 位元組，quality 為 None 時用 Pillow 預設品質"""
+        buf = io.BytesIO()
+        if quality is None:
+            img.save(buf, fmt.upper())
+        else:
+            img.save(buf, fmt.upper(), quality=quality)
+        return buf.getvalue()
+
+    def _jpeg_ready(self, img):
+        """JPEG 只能存 RGB / L，其餘模式 (RGBA、P...) 先轉 RGB"""
+        return img if img.mode in ("RGB", "L") else img.convert("RGB")
+
+    def _find_orig_backup(self, out_dir, base_name):
+        """-o 可能是 .jpg 或保留原格式的 .png/.bmp，取最新的那一個"""
+        best = None
+        for ext in ORIG_EXTS:
+            path = os.path.join(out_dir, f"{base_name}-o{ext}")
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            if best is None or mtime > best[0]:
+                best = (mtime, path, ext)
+        return (best[1], best[2]) if best else (None, ".jpg")
+
+    def _handle_restore(self, rule, outcome="", started=None, reason=None):
+        """執行還原：從 output_dir 搬移到 restore_dir (reason 為破損原因，寫進落地紀錄)"""
+        # 計算總異常次數
+        total_errors = rule.count_broken + rule.count_no_update + rule.count_missing
+        
+        # 決定還原目的地 (如果沒設 restore_dir，就用來源目錄或輸出目錄)
+        restore_dest = rule.restore_dir or rule.output_dir
+        os.makedirs(restore_dest, exist_ok=True)
+
+        base_name = os.path.splitext(rule.source_filename)[0]
+        
+        # 有備份歷史就還原最新一張通過檢查的畫面；
+        # 否則奇數次還原最大的縮圖變體 (預設 -s), 偶數次還原 -o。
+        # 上次還原的就是這組備份其中之一時沿用同一份，目的地沒被動過就不必再寫。
+        # 目的地檔名固定用來源檔名，不論還原哪一份，下游程式都讀同一個檔
+        history = self._history(rule.output_dir)
+        frame = history.latest(rule.id) if history is not None else None
+        if frame is not None:
+            source_file = frame[1]
+            restore_suffix = f"歷史 {datetime.fromtimestamp(frame[0]):%m-%d %H:%M:%S}"
+        else:
+            variant = rule.output_variants()[0]
+            small_suffix = f"{variant['suffix']}{VARIANT_FORMATS[variant['format']]}"
+            orig_file, ext = self._find_orig_backup(rule.output_dir, base_name)
+            backups = [(os.path.join(rule.output_dir, f"{base_name}{small_suffix}"), small_suffix),
+                       (orig_file, f"-o{ext}")]
+            last_src = (rule.last_restore or {}).get('src')
+            kept = [b for b in backups if b[0] and b[0] == last_src and os.path.exists(b[0])]
+            source_file, restore_suffix = kept[0] if kept else backups[0 if total_errors % 2 != 0 else 1]
+        target_file = os.path.join(restore_dest, rule.source_filename)
+
+        fields = self._log_fields(rule, outcome, started)
+        if reason:
+            fields["reason"] = reason
+        if source_file and os.path.exists(source_file):
+            with self.metrics.stage("restore"):
+                how = self._restore_file(rule, source_file, target_file)
+            if how == "same":
+                self.logger.write_log(f"規則 {rule.id} 異常! 目的地已是備份檔 {restore_suffix}，略過還原。",
+                                      **fields, restored=restore_suffix,
+                                      restore="skipped")
+            else:
+                self.logger.write_log(f"規則 {rule.id} 異常! 已還原備份檔 {restore_suffix} 至目的地。",
+                                      **fields, restored=restore_suffix,
+                                      restore=how)
+        else:
+            self.logger.write_log(f"規則 {rule.id} 嚴重錯誤: 找不到備份檔可還原。",
+                                  **fields, restored=None)
+
+    def _main_loop(self):
+        """計時器核心循環"""
+        while self.is_running:
+            self._drain_edits()
+            mode = self.timer_mode
+            setting = self.timer_setting
+            now = time.time()
+
+            if mode == "固定秒數":
+                try:
+                    interval = float(setting)
+                    if self.next_run_time == 0: self.next_run_time = now + interval
+                    
+                    remaining = self.next_run_time - now
+                    if remaining <= 0:
+                        self._trigger_scan()
+                        self.next_run_time = now + interval
+                    else:
+                        self._publish("countdown", f"下次掃描倒數: {int(remaining)} 秒")
+                except: pass
+
+            elif mode == "指定分鐘":
+                try:
+                    target_minutes = [int(m.strip()) for m in setting.split(',')]
+                    curr_time = datetime.now()
+                    curr_min = curr_time.minute
+                    
+                    if curr_min in target_minutes and curr_min != self.last_triggered_minute:
+                        self._trigger_scan()
+                        self.last_triggered_minute = curr_min
+                    
+                    self._publish("countdown", f"定時掃描: {setting} 分")
+                except: pass
+
+            elif mode == "監看變更":
+                try:
+                    self._watch_tick(now, setting)
+                except Exception as e:
+                    self.logger.write_log(f"監看模式錯誤: {e}")
+
+            elif mode == "個別排程":
+                try:
+                    self._schedule_tick(now, setting)
+                except Exception as e:
+                    self.logger.write_log(f"個別排程錯誤: {e}")
+
+            if mode != "監看變更" and self._watcher is not None:
+                self._watcher.stop()
+                self._watcher = None
+            if mode != "個別排程" and self._sched_sig:
+                self._sched_heap, self._sched_due, self._sched_sig = [], {}, {}
+
+            time.sleep(1)
+
+        # 關閉前把還在排隊的修改套用掉，讓之後的 flush 寫得到
+        self._drain_edits()
+
+    def _active_rules(self):
+        return [r for r in self._snapshot.rules if r.enabled and r.source_filename]
+
+    def _watch_tick(self, now, setting):
+        """
+        監看模式的每秒工作：
+        1. 處理已經靜止超過 watch_debounce 秒的來源變動 (只掃受影響的規則)
+        2. 每 setting 秒做一次全域巡檢，補上遺失 / 無更新的判定
+        """
+        from file_watcher import SourceWatcher, watch_key
+
+        sweep_interval = float(setting) if setting else 300.0
+        if self._watcher is None:
+            self._watcher = SourceWatcher(self._on_source_changed, self.settings["watch_poll_interval"])
+            self.next_sweep_time = 0
+            mode_text = "事件通知" if self._watcher.uses_events else "輪詢"
+            self.logger.write_log(f"監看模式啟動 ({mode_text})，巡檢間隔 {sweep_interval:.0f} 秒。")
+
+        if self.next_sweep_time == 0 or now >= self.next_sweep_time:
+            # 巡檢時順便重建監看清單，規則編輯後不需重啟
+            self._watcher.update({watch_key(r.source_dir, r.source_filename) for r in self._active_rules()})
+            if self.next_sweep_time:
+                self._trigger_scan()
+            self.next_sweep_time = now + sweep_interval
+
+        debounce = float(self.settings["watch_debounce"])
+        settle = time.monotonic() - debounce
+        with self._changed_lock:
+            ready = {k for k, t in self._changed.items() if t <= settle}
+            for key in ready:
+                del self._changed[key]
+        if ready:
+            rules = [r for r in self._active_rules()
+                     if watch_key(r.source_dir, r.source_filename) in ready]
+            if rules:
+                self._trigger_scan(rules, "變更觸發")
+
+        self._publish("countdown", f"監看中，下次巡檢: {int(self.next_sweep_time - now)} 秒")
+
+    def _next_due(self, rule, now, default_interval):
+        """
+        計算規則下次到期時間：
+        schedule_minutes (例如 "0,30") 優先，否則用 interval 秒 (0 = 沿用全域設定)；
+        backoff > 1 時，連續遺失 / 無更新會把間隔乘上 backoff^次數，最多到 backoff_max。
+        """
+        minutes = rule.schedule_minutes
+        if minutes:
+            wanted = {int(m) for m in str(minutes).split(',') if m.strip()}
+            base = int(now // 60) * 60
+            for step in range(1, 61):
+                if datetime.fromtimestamp(base + step * 60).minute in wanted:
+                    return base + step * 60
+        interval = float(rule.interval or default_interval)
+        backoff = float(rule.backoff or 1.0)
+        streak = self._sched_streak.get(rule.id, 0)
+        if backoff > 1.0 and streak and interval > 0:
+            cap = max(interval, float(self.settings["backoff_max"]))
+            # 次數超過到達上限所需就不再乘，避免長期離線的相機讓 backoff ** streak 溢位
+            streak = min(streak, math.ceil(math.log(cap / interval, backoff)))
+            interval = min(interval * backoff ** streak, cap)
+        return now + interval
+
+    def _schedule_tick(self, now, setting):
+        """個別排程模式的每秒工作：同步排程表、派發到期規則、重新排入下一次"""
+        default_interval = float(setting) if setting else 10.0
+        active = {r.id: r for r in self._active_rules()}
+
+        # 新增 / 被編輯的規則重新排程，初次排程平均分散在一個間隔內，避免同時爆量讀檔
+        fresh = [r for rid, r in active.items()
+                 if self._sched_sig.get(rid) != (r.interval, r.schedule_minutes)]
+        for i, r in enumerate(fresh):
+            self._sched_sig[r.id] = (r.interval, r.schedule_minutes)
+            try:
+                due = self._next_due(r, now, default_interval)
+            except (ValueError, OverflowError) as e:
+                # 單條規則設定有誤只略過它 (記錄一次，改設定後會重新排程)，不影響其他規則
+                self._sched_due.pop(r.id, None)
+                self.logger.write_log(f"規則 {r.id} 排程設定錯誤 ({e})，暫不排程。")
+                continue
+            if not r.schedule_minutes:
+                due = now + (due - now) * (i + 1) / len(fresh)
+            self._sched_due[r.id] = due
+            heapq.heappush(self._sched_heap, (due, r.id))
+        for rid in set(self._sched_sig) - set(active):
+            self._sched_due.pop(rid, None)
+            del self._sched_sig[rid]
+
+        # 取出所有到期的規則 (已被重排或停用的 heap 項目直接丟掉)
+        due_rules = []
+        while self._sched_heap and self._sched_heap[0][0] <= now:
+            due, rid = heapq.heappop(self._sched_heap)
+            if self._sched_due.get(rid) == due:
+                due_rules.append(active[rid])
+
+        if due_rules:
+            before = {r.id: (r.count_missing, r.count_no_update) for r in due_rules}
+            try:
+                self._trigger_scan(due_rules, "個別排程")
+            finally:
+                # 掃描中途出錯也要排回下一次，否則這些規則會永遠從排程表消失
+                done = time.time()
+                latest = self._snapshot.by_id
+                for r in due_rules:
+                    r = latest.get(r.id, r)
+                    if (r.count_missing, r.count_no_update) != before[r.id]:
+                        self._sched_streak[r.id] = self._sched_streak.get(r.id, 0) + 1
+                    else:
+                        self._sched_streak[r.id] = 0
+                    due = self._next_due(r, done, default_interval)
+                    self._sched_due[r.id] = due
+                    heapq.heappush(self._sched_heap, (due, r.id))
+
+        # 倒數顯示下一條到期的規則
+        while self._sched_heap and self._sched_due.get(self._sched_heap[0][1]) != self._sched_heap[0][0]:
+            heapq.heappop(self._sched_heap)
+        if self._sched_heap:
+            due, rid = self._sched_heap[0]
+            self._publish("countdown", f"下一條: 規則 {rid}，倒數 {max(0, int(due - time.time()))} 秒")
+        else:
+            self._publish("countdown", "個別排程: 沒有啟用的規則")
+
+    def _on_source_changed(self, directory, filename):
+        """watcher 執行緒呼叫：只記錄變動時間，等防抖期過了才由主循環處理"""
+        with self._changed_lock:
+            self._changed[(directory, filename)] = time.monotonic()
+
+    def profile_next_scan(self, path):
+        """要求下一次全域掃描用 cProfile 剖析，結果 dump 到 path (可用 pstats / snakeviz 查看)"""
+        self.settings["profile_next_scan"] = path
+
+    def _trigger_scan(self, rules=None, label="全域輪詢"):
+        """全域掃描動作 (rules 指定時只掃這些規則)"""
+        profile_path = self.settings["profile_next_scan"] if rules is None else ""
+        if not profile_path:
+            return self._run_scan(rules, label)
+
+        # cProfile 只看得到本執行緒，剖析的這一輪改為逐條掃描，才能收到完整的呼叫統計
+        self.settings["profile_next_scan"] = ""
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            self._run_scan(rules, label, serial=True)
+        finally:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+            self.logger.write_log(f"已輸出本輪掃描剖析結果: {profile_path}")
+
+    def _run_scan(self, rules, label, serial=False):
+        self.logger.write_log(f">>> [{label}啟動] <<<")
+        started = time.perf_counter()
+        self.metrics.begin_pass()
+        if rules is None:
+            rules = self._active_rules()
+        # 先套用已排隊的修改，再複製這一輪要掃的規則：掃描改的是副本，GUI 看到的快照在整輪結束前都不會變
+        self._drain_edits()
+        by_id = self._snapshot.by_id
+        work = {r.id: copy.copy(by_id[r.id]) for r in rules if r.id in by_id and by_id[r.id].enabled}
+        rules = list(work.values())
+
+        stale = set()
+        if serial:
+            for rule in rules:
+                self._process_rule_safely(rule)
+        elif int(self.settings["scan_processes"]) > 0 and len(rules) > 1:
+            self._process_scan(rules)
+        else:
+            stale = self._scan_local(rules)
+
+        elapsed = time.perf_counter() - started
+        stats = self.metrics.end_pass(elapsed)
+        self.logger.write_log(f"<<< [{label}結束] {len(rules)} 條規則，耗時 {elapsed:.2f} 秒 >>> "
+                              + self.metrics.summary_line(stats),
+                              outcome="pass", rules=len(rules), duration_ms=round(elapsed * 1000, 1),
+                              **stats)
+        self._export_metrics()
+
+        # 逾時規則的副本還可能被背景執行緒改寫，本輪不發佈；再套上掃描期間排隊的修改
+        for rid in stale:
+            del work[rid]
+        self._apply_edits(work)
+        self._commit(work)
+
+        # 掃描完後，通知觀察者 (GUI) 更新畫面
+        self._publish("scan_done", [r.id for r in rules])
+
+    def _export_metrics(self):
+        path = self.settings["metrics_export"]
+        now = time.time()
+        if not path or now - self._last_export < float(self.settings["metrics_export_every"]):
+            return
+        self._last_export = now
+        try:
+            self.metrics.export(path, self.settings["metrics_format"])
+        except OSError as e:
+            self.logger.write_log(f"指標匯出失敗: {e}")
+
+    def _share_key(self, source_dir):
+        """取出來源所在的分享：磁碟機代號 (R:)、UNC 主機與分享名，或 POSIX 掛載點前兩層"""
+        path = os.path.normcase(os.path.abspath(source_dir or "."))
+        drive, rest = os.path.splitdrive(path)
+        if drive:
+            return drive
+        parts = [p for p in rest.replace("\\", "/").split("/") if p]
+        return "/" + "/".join(parts[:2])
+
+    def _share_lock(self, source_dir):
+        key = self._share_key(source_dir)
+        with self._share_locks_guard:
+            lock = self._share_locks.get(key)
+            if lock is None:
+                lock = threading.BoundedSemaphore(max(1, int(self.settings["share_limit"])))
+                self._share_locks[key] = lock
+        return lock
+
+    def _run_guarded(self, rule, started_at, timeout):
+        """
+        平行模式的單條規則：先取得分享閘門，再走原本的 F1 -> F2 -> F3。
+        計時從執行緒接手就開始 (等閘門也算)，同分享有規則卡住時，等不到閘門的規則本輪略過。
+        """
+        started_at[rule.id] = time.monotonic()
+        gate = self._share_lock(rule.source_dir)
+        if not gate.acquire(timeout=timeout):
+            self.logger.write_log(f"規則 {rule.id} 等待分享逾時 ({timeout:.0f} 秒)，本輪略過。")
+            return
+        try:
+            self._process_rule(rule)
+        finally:
+            gate.release()
+
+    def _scan_local(self, rules):
+        """在本行程內掃描：asyncio、執行緒池或逐條；回傳逾時 (仍在背景處理) 的規則 ID"""
+        if self.settings["async_scan"] and rules:
+            return asyncio.run(self._async_scan(rules))
+        if self.settings["scan_workers"] > 1 and len(rules) > 1:
+            return self._parallel_scan(rules)
+        for rule in rules:
+            self._process_rule_safely(rule)
+        return set()
+
+    def _process_rule_safely(self, rule):
+        """逐條模式的單條規則：例外 (例如還原目的地離線) 只記錄，不中斷整輪，其他規則的結果照常發佈"""
+        try:
+            self._process_rule(rule)
+        except Exception as e:
+            self.logger.write_log(f"規則 {rule.id} 掃描例外: {e}")
+
+    def _ensure_pool(self):
+        workers = max(1, int(self.settings["scan_workers"]))
+        # 上一輪逾時的工作還卡著執行緒：換一個新的執行緒池，舊的等卡住的工作結束後自行收掉
+        self._stuck_work = [f for f in self._stuck_work if not f.done()]
+        if self._stuck_work and self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+            self._stuck_work = []
+        if self._pool is None or self._pool_size != workers:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+            self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan")
+            self._pool_size = workers
+        return self._pool
+
+    async def _async_scan(self, rules):
+        """
+        asyncio 掃描：阻塞的檔案操作都丟到有上限的執行緒池，每個分享 (主機) 一個 Semaphore。
+        每個分享每輪只探測一次 (獨立的 daemon 執行緒，不佔掃描執行緒池)，同分享的規則都等這個結果；
+        io_timeout 內沒回應的分享整輪標記為無回應，其規則直接算遺失，不會讓一個掛掉的 NAS 拖長整輪掃描。
+        """
+        loop = asyncio.get_running_loop()
+        pool = self._ensure_pool()
+        workers = max(1, int(self.settings["scan_workers"]))
+        # 單一分享最多佔 scan_workers - 1 條執行緒，卡住時至少留一條給其他分享
+        limit = max(1, min(int(self.settings["share_limit"]), workers - 1))
+        io_timeout = float(self.settings["io_timeout"])
+        rule_timeout = float(self.settings["rule_timeout"])
+        gates = {}
+        stale = set()
+        # 上一輪探測還卡著沒回來的分享，本輪不再送新的探測進執行緒池
+        dead = {key for key, probe in self._stuck_probes.items() if probe.is_alive()}
+        self._stuck_probes = {key: self._stuck_probes[key] for key in dead}
+        probes = {}  # 分享 -> 本輪探測的 Task
+
+        # 同時送進執行緒池的工作不超過執行緒數，正常情況下不會排隊；
+        # 只有前面逾時的規則把執行緒卡住時才會排隊，而排隊時間也算在 timeout 內
+        slots = asyncio.Semaphore(workers)
+
+        async def in_pool(timeout, fn, *args):
+            """丟進執行緒池執行，排隊加執行合計 timeout 秒；回傳 (future, 是否逾時)，逾時時還沒開始的工作直接取消"""
+            async with slots:
+                future = pool.submit(fn, *args)
+                try:
+                    await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+                except asyncio.TimeoutError:
+                    if not future.cancel():
+                        self._stuck_work.append(future)
+                    return future, True
+                return future, False
+
+        async def probe(key, path):
+            """探測分享是否有回應 (結果不用：目錄不存在會很快回來，交給 F1 處理)；逾時回傳 False"""
+            answered = loop.create_future()
+            def report():
+                if not answered.done():
+                    answered.set_result(None)
+            def call():
+                try:
+                    os.path.exists(path)
+                finally:
+                    try:
+                        loop.call_soon_threadsafe(report)
+                    except RuntimeError:
+                        pass  # 這輪早已結束 (事件迴圈已關閉)
+            thread = threading.Thread(target=call, name="share-probe", daemon=True)
+            thread.start()
+            try:
+                await asyncio.wait_for(answered, io_timeout)
+                return True
+            except asyncio.TimeoutError:
+                dead.add(key)
+                self._stuck_probes[key] = thread
+                self.logger.write_log(f"分享 {key} 在 {io_timeout:.0f} 秒內沒有回應，本輪略過其餘規則。")
+                return False
+
+        async def run(rule):
+            started = time.perf_counter()
+            key = self._share_key(rule.source_dir)
+            if key in dead:
+                return self._share_unreachable(rule, started)
+            if key not in probes:
+                probes[key] = asyncio.ensure_future(probe(key, rule.source_dir or "."))
+            if not await probes[key]:
+                return self._share_unreachable(rule, started)
+            gate = gates.setdefault(key, asyncio.Semaphore(limit))
+            async with gate:
+                if key in dead:  # 等閘門時同分享已有規則逾時
+                    return self._share_unreachable(rule, started)
+                future, timed_out = await in_pool(rule_timeout, self._process_rule, rule)
+                if timed_out:
+                    # 執行緒仍在跑 (無法強制中斷)，它的結果不採用；同分享其餘規則本輪不再送進執行緒池
+                    stale.add(rule.id)
+                    self.logger.write_log(f"規則 {rule.id} 處理逾時 ({rule_timeout:.0f} 秒)，本輪不再等待。")
+                    if key not in dead:
+                        dead.add(key)
+                        self.logger.write_log(f"分享 {key} 有規則處理逾時，本輪略過其餘規則。")
+                elif future.exception() is not None:
+                    self.logger.write_log(f"規則 {rule.id} 掃描例外: {future.exception()}")
+
+        await asyncio.gather(*(run(r) for r in rules))
+        return stale
+
+    def _share_unreachable(self, rule, started):
+        """分享無回應：本輪算遺失；還原目的地可能在同一個分享上，所以不做還原"""
+        rule.count_missing += 1
+        rule.status = "異常"  # 標註異常
+        self.logger.write_log(f"規則 {rule.id} 來源分享無回應，本輪視為遺失 (不還原)。",
+                              **self._log_fields(rule, "missing", started))
+
+    def _parallel_scan(self, rules):
+        """用固定大小的執行緒池掃描，每條規則各自計時，逾時的規則不再等待 (回傳其 ID)"""
+        self._ensure_pool()
+
+        timeout = float(self.settings["rule_timeout"])
+        started_at = {}
+        stale = set()
+        pending = {self._pool.submit(self._run_guarded, r, started_at, timeout): r for r in rules}
+        last_done = time.monotonic()
+
+        while pending:
+            done, _ = wait(pending, timeout=min(0.5, timeout), return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+            for future in done:
+                last_done = now
+                rule = pending.pop(future)
+                err = future.exception()
+                if err is not None:
+                    self.logger.write_log(f"規則 {rule.id} 掃描例外: {err}")
+
+            # 執行緒池整整 timeout 秒沒有任何規則開始或結束 (執行緒都被卡住的規則佔滿)：
+            # 還在排隊的規則取消，本輪不做
+            progress = max(last_done, max(started_at.values(), default=last_done))
+            if now - progress > timeout:
+                for future, rule in list(pending.items()):
+                    if rule.id not in started_at and future.cancel():
+                        del pending[future]
+                        self.logger.write_log(f"規則 {rule.id} 排隊逾時 (執行緒都在等卡住的規則)，本輪略過。")
+
+            # 逾時的規則：執行緒仍在跑 (無法強制中斷)，它的結果不採用
+            for future, rule in list(pending.items()):
+                t0 = started_at.get(rule.id)
+                if t0 is not None and now - t0 > timeout:
+                    del pending[future]
+                    self._stuck_work.append(future)
+                    stale.add(rule.id)
+                    self.logger.write_log(f"規則 {rule.id} 處理逾時 ({timeout:.0f} 秒)，本輪不再等待。")
+        return stale
+
+    def _shard_of(self, rule, shards):
+        """規則分到哪個子行程：同一個分享 (_share_key) 固定在同一片，分享閘門才繼續有效"""
+        # 開啟備份歷史時一律依輸出目錄分片：同一個歷史庫每輪只有一個子行程在寫
+        if int(self.settings["history_depth"]) > 0:
+            folder = rule.output_dir
+        elif self.settings["shard_by"] == "id":
+            return rule.id % shards
+        else:
+            # 閘門以分享為單位：同分享不同目錄若分到不同子行程，同時連線數會超過 share_limit
+            return zlib.crc32(self._share_key(rule.source_dir).encode("utf-8")) % shards
+        key = os.path.normcase(os.path.abspath(folder or "."))
+        return zlib.crc32(key.encode("utf-8")) % shards
+
+    def _process_scan(self, rules):
+        """
+        多行程分片掃描：每片規則的副本送到子行程，子行程跑原本的 F1 -> F2 -> F3，
+        再把掃描狀態、log 與指標樣本傳回來。只有協調者 (本行程) 會改規則與寫設定檔。
+        """
+        n = int(self.settings["scan_processes"])
+        if self._proc_pool is None or self._proc_pool_size != n:
+            if self._proc_pool is not None:
+                self._proc_pool.shutdown(wait=False, cancel_futures=True)
+            self._proc_pool = ProcessPoolExecutor(max_workers=n)
+            self._proc_pool_size = n
+
+        shards = [[] for _ in range(n)]
+        for rule in rules:
+            shards[self._shard_of(rule, n)].append(rule)
+        # 子行程內不再分片，也不做剖析 / 指標匯出 (由協調者統一處理)
+        child_settings = dict(self.settings, scan_processes=0, profile_next_scan="", metrics_export="")
+        by_id = {r.id: r for r in rules}
+        pending = {}
+        for shard in shards:
+            if shard:
+                skips = {r.id: self._stat_skips.get(r.id, 0) for r in shard}
+                future = self._proc_pool.submit(_scan_shard, child_settings, shard, skips)
+                pending[future] = shard
+
+        # 每片最多等「規則逾時 x 該片需要幾批執行緒」
+        workers = max(1, int(self.settings["scan_workers"]))
+        timeout = float(self.settings["rule_timeout"]) * -(-max(len(s) for s in pending.values()) // workers)
+        done, not_done = wait(pending, timeout=timeout)
+        for future in done:
+            try:
+                states, logs, samples, skips = future.result()
+            except Exception as e:
+                # 子行程當掉 (BrokenProcessPool 等)：這片本輪沒有結果，下次重建行程池
+                self.logger.write_log(f"分片掃描失敗 ({len(pending[future])} 條規則): {e}")
+                self._proc_pool_size = 0
+                continue
+            for rid, state in states:
+                rule = by_id[rid]
+                for key, value in state.items():
+                    setattr(rule, key, value)
+            for text, fields in logs:
+                self.logger.write_log(text, **fields)
+            self.metrics.merge(samples)
+            self._stat_skips.update(skips)
+        for future in not_done:
+            ids = ", ".join(str(r.id) for r in pending[future])
+            self.logger.write_log(f"分片掃描逾時 ({timeout:.0f} 秒)，規則 {ids} 本輪不更新。")
+
+    def check_file(self, rule):
+        rid = rule.id
+        base_path = rule.location
+        file_name = rule.source_filename
+        
+        # 1. 自動識別副檔名 (錨點：支援 PNG/JPG)
+        # 如果使用者寫 filename.jpg 但實際是 .png，或者反之
+        exts = ['', '.jpg', '.png', '.JPG', '.PNG']
+        target_path = None
+        for ext in exts:
+            temp_path = os.path.join(base_path, file_name + ext if not file_name.endswith(ext) else file_name)
+            if os.path.exists(temp_path):
+                target_path = temp_path
+                break
+
+        # 將原本的 self.main_app.tab4 改為：
+        #if hasattr(self.main_app, 'tab4_ref'):
+        #    self.main_app.tab4_ref.update_status(rid, "遺失", "lost")
+        #return
+
+        # 2. 檢查檔案是否損壞 (模擬邏輯)
+        if os.path.getsize(target_path) == 0:
+            self.main_app.tab4.update_status(rid, "損壞", "broken")
+        else:
+            self.main_app.tab4.update_status(rid, "正常")
+        
+        # 假設你判定檔案遺失了
+        if not os.path.exists(target_path):
+        # [精確跳線]：呼叫 Tab4 的接收端，並傳入對應的錯誤類型
+            if hasattr(self.main_app, 'tab4_ref'):
+            # 傳入 "lost" 會讓計數器的「遺失」欄位 +1
+                self.main_app.tab4_ref.update_status(rid, "遺失", "lost")
+
+
+class _ShardLogger:
+    """子行程用的 logger：先收集起來，隨掃描結果一起傳回協調者再輸出"""
+    def __init__(self):
+        self.entries = []
+
+    def write_log(self, text, **fields):
+        self.entries.append((text, fields))
+
+
+_shard_engine = None  # 子行程內重複使用的引擎 (保留執行緒池與讀檔緩衝)
+
+
+def _scan_shard(settings, rules, stat_skips):
+    """子行程入口：掃描一片規則 (副本)，回傳 (掃描狀態, log, 指標樣本, 快速路徑計數)"""
+    global _shard_engine
+    logger = _ShardLogger()
+    if _shard_engine is None or _shard_engine.settings != settings:
+        _shard_engine = TaskEngine([], logger, settings=settings, start=False)
+    engine = _shard_engine
+    engine.logger = logger
+    engine.metrics = ScanMetrics()
+    engine._stat_skips = stat_skips
+    engine._histories = {}  # 歷史索引可能被別的子行程改過，每片重新載入
+    engine._scan_local(rules)
+    states = [(r.id, {key: getattr(r, key) for key in SCAN_STATE_FIELDS}) for r in rules]
+    return states, logger.entries, engine.metrics.samples(), engine._stat_skips
+
+
+class ConsoleLogger:
+    """headless 模式的 logger：印到 stdout，並可同時寫入 LogFileSink"""
+    def __init__(self, sink=None):
+        self.sink = sink
+
+    def write_log(self, text, **fields):
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        print(f"[{timestamp}] {text}", flush=True)
+        if self.sink is not None:
+            self.sink.write({"ts": timestamp, "msg": text, **fields})
+
+
+def main(argv=None):
+    """headless 入口：python -m task_engine --config rules_config.json"""
+    from config_manager import ConfigManager
+    from log_sink import LogFileSink
+
+    ap = argparse.ArgumentParser(prog="python -m task_engine", description="IoW 檔案備份引擎 (無 GUI)")
+    ap.add_argument("--config", default="rules_config.json", help="規則設定檔路徑")
+    ap.add_argument("--mode", default="固定秒數", choices=TIMER_MODES, help="計時模式")
+    ap.add_argument("--setting", default="10.0",
+                    help="秒數、以逗號分隔的分鐘清單、監看模式的巡檢秒數，或個別排程的預設間隔")
+    ap.add_argument("--log-dir", default=None, help="落地紀錄目錄 (不指定則只印到畫面)")
+    ap.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                    help="覆寫引擎參數，VALUE 以 JSON 解析，例如 --set scan_workers=8")
+    ap.add_argument("--once", action="store_true", help="只掃描一輪就結束")
+    ap.add_argument("--profile", default="", metavar="PATH",
+                    help="以 cProfile 剖析下一次全域掃描並輸出到 PATH")
+    args = ap.parse_args(argv)
+
+    config_mgr = ConfigManager(args.config)
+    rules = config_mgr.load_config()
+    settings = dict(config_mgr.engine_settings)   # 設定檔的 engine 區段，再由 --set 覆寫
+    for item in args.set:
+        key, _, value = item.partition("=")
+        try:
+            settings[key] = json.loads(value)
+        except ValueError:
+            settings[key] = value
+
+    sink = LogFileSink(args.log_dir) if args.log_dir else None
+    logger = ConsoleLogger(sink)
+    for err in config_mgr.load_errors:
+        logger.write_log(f"設定檔警告: {err}")
+    if args.profile:
+        settings["profile_next_scan"] = args.profile
+    engine = TaskEngine(rules, logger, config_mgr=config_mgr, settings=settings,
+                        timer_mode=args.mode, timer_setting=args.setting, start=not args.once)
+    try:
+        if args.once:
+            engine._trigger_scan()
+        else:
+            while engine.thread.is_alive():
+                engine.thread.join(1.0)
+    except KeyboardInterrupt:
+        engine.stop()
+    finally:
+        engine.stop()
+        config_mgr.flush()
+        if sink is not None:
+            sink.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+import copy
+
+from config_manager import ConfigManager
+
+
+def make_manager(tmp_path):
+    return ConfigManager(file_path=str(tmp_path / "rules.json"), flush_delay=60)
+
+
+def reload(tmp_path):
+    return {r.id: r for r in make_manager(tmp_path).load_config()}
+
+
+def test_save_config_keeps_newer_dirty_rules(tmp_path):
+    cm = make_manager(tmp_path)
+    rules = cm.load_config()
+    stale = list(rules)
+
+    # 引擎在呼叫端讀清單之後才發佈新版規則 1
+    newer = copy.copy(rules[0])
+    newer.location = "新位置"
+    cm.mark_dirty([newer], all_rules=[newer] + rules[1:])
+    cm.save_config(stale)
+    cm.flush()
+
+    assert reload(tmp_path)[1].location == "新位置"
+
+
+def test_save_config_defaults_to_latest_rules(tmp_path):
+    cm = make_manager(tmp_path)
+    rules = cm.load_config()
+    newer = copy.copy(rules[1])
+    newer.count_broken = 7
+    cm.mark_dirty([newer], all_rules=[rules[0], newer] + rules[2:])
+
+    assert cm.save_config()
+    assert reload(tmp_path)[2].count_broken == 7
+
+
+def test_journal_replay_applies_records_and_ignores_torn_line(tmp_path):
+    cm = make_manager(tmp_path)
+    rules = cm.load_config()
+    cm.save_config()
+    rules[0].location = "A"
+    rules[2].count_missing = 4
+    cm.mark_dirty([rules[0], rules[2]])
+    cm.flush()
+    with open(cm.journal_path, 'a', encoding='utf-8') as f:
+        f.write('{"id": 1, "location": "半')  # 寫到一半當機
+
+    cm2 = make_manager(tmp_path)
+    by_id = {r.id: r for r in cm2.load_config()}
+    assert by_id[1].location == "A"
+    assert by_id[3].count_missing == 4
+    assert cm2.load_errors == []
+
+
+def test_load_reports_bad_rules_and_pads_ids(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text('{"version": 2, "max_rules": 3, "rules": ['
+                    '{"id": 2, "target_x": "wide"}, {"id": 2}, {"id": 9}, "junk"]}', encoding="utf-8")
+    cm = make_manager(tmp_path)
+    rules = cm.load_config()
+    assert [r.id for r in rules] == [1, 2, 3]
+    assert rules[1].target_x == 800
+    assert len(cm.load_errors) == 4
+
+
+def test_corrupt_file_is_kept(tmp_path):
+    (tmp_path / "rules.json").write_text("{not json", encoding="utf-8")
+    cm = make_manager(tmp_path)
+    assert len(cm.load_config()) == cm.max_rules
+    assert (tmp_path / "rules.json.corrupt").exists()
@@ -0,0 +1,48 @@
+import os
+
+from history_store import HistoryStore
+
+
+def blobs(store):
+    return sorted(os.listdir(store.blob_dir))
+
+
+def test_depth_eviction_and_dedup(tmp_path):
+    store = HistoryStore(str(tmp_path), depth=2)
+    for i, content in enumerate([b"a" * 10, b"b" * 10, b"b" * 10, b"c" * 10]):
+        store.add(1, f"h:{content[:1].decode()}", content, ".jpg", now=100 + i)
+
+    ts, path = store.latest(1)
+    assert ts == 103 and path.endswith("h-c.jpg")
+    assert blobs(store) == ["h-b.jpg", "h-c.jpg"]  # 連續相同內容只記一筆，超過深度的 a 被刪
+    assert store.total_bytes == 20
+
+
+def test_shared_blob_kept_until_unreferenced(tmp_path):
+    store = HistoryStore(str(tmp_path), depth=1)
+    store.add(1, "h:x", b"x" * 10, ".jpg", now=1)
+    store.add(2, "h:x", b"x" * 10, ".jpg", now=2)
+    store.add(1, "h:y", b"y" * 10, ".jpg", now=3)
+    assert blobs(store) == ["h-x.jpg", "h-y.jpg"]  # 規則 2 還在用 x
+    store.add(2, "h:z", b"z" * 10, ".jpg", now=4)
+    assert blobs(store) == ["h-y.jpg", "h-z.jpg"]
+
+
+def test_age_and_size_limits_keep_newest(tmp_path):
+    store = HistoryStore(str(tmp_path), depth=10, max_age=50, max_bytes=25)
+    store.add(1, "h:a", b"a" * 10, ".jpg", now=0)
+    store.add(1, "h:b", b"b" * 10, ".jpg", now=100)  # a 超過 50 秒
+    assert blobs(store) == ["h-b.jpg"]
+    store.add(2, "h:c", b"c" * 10, ".jpg", now=101)
+    store.add(2, "h:d", b"d" * 10, ".jpg", now=102)  # 總量 30 > 25：丟最舊且非最新的 c
+    assert blobs(store) == ["h-b.jpg", "h-d.jpg"]
+    store.add(3, "h:e", b"e" * 10, ".jpg", now=103)  # 每條規則最新一筆都保留
+    assert store.total_bytes == 30
+
+
+def test_reload_restores_index(tmp_path):
+    store = HistoryStore(str(tmp_path), depth=3)
+    store.add(7, "h:a", b"a" * 10, ".png", now=5)
+    again = HistoryStore(str(tmp_path), depth=3)
+    assert again.latest(7) == (5, os.path.join(again.blob_dir, "h-a.png"))
+    assert again.total_bytes == 10
@@ -0,0 +1,40 @@
+import os
+import time
+
+from log_sink import LogFileSink
+
+
+def rotated_files(log_dir):
+    return [name for name in os.listdir(log_dir) if name.startswith("iow.log.")]
+
+
+def test_rotation_age_survives_restart(tmp_path):
+    sink = LogFileSink(str(tmp_path), rotate_seconds=100, compress=False, flush_interval=0.05)
+    sink.write({"msg": "first"})
+    sink.close()
+
+    # 模擬這一段已經寫了 200 秒，中間程式重開過
+    with open(sink.started_path, 'w', encoding='utf-8') as f:
+        f.write(repr(time.time() - 200))
+    os.utime(sink.path)
+
+    sink = LogFileSink(str(tmp_path), rotate_seconds=100, compress=False, flush_interval=0.05)
+    sink.write({"msg": "second"})
+    time.sleep(0.3)
+    sink.close()
+
+    assert len(rotated_files(str(tmp_path))) == 1
+
+
+def test_new_segment_restarts_the_clock(tmp_path):
+    sink = LogFileSink(str(tmp_path), rotate_seconds=100, compress=False, flush_interval=0.05)
+    sink.write({"msg": "first"})
+    time.sleep(0.2)
+    sink.close()
+
+    sink = LogFileSink(str(tmp_path), rotate_seconds=100, compress=False, flush_interval=0.05)
+    sink.write({"msg": "second"})
+    time.sleep(0.2)
+    sink.close()
+
+    assert rotated_files(str(tmp_path)) == []
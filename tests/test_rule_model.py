@@ -0,0 +1,81 @@
+import pytest
+
+from rule_model import Rule, check_schedule_minutes
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("", ""),
+    ("0,30", "0,30"),
+    (" 30 , 0 ,", "0,30"),
+    ("15,15", "15"),
+])
+def test_schedule_minutes_normalized(text, expected):
+    assert check_schedule_minutes(text) == expected
+
+
+@pytest.mark.parametrize("text", ["0;30", "60", "-1", "abc"])
+def test_schedule_minutes_rejected(text):
+    with pytest.raises(ValueError):
+        check_schedule_minutes(text)
+    rule = Rule(id=1, schedule_minutes="5")
+    errors = rule.update({"schedule_minutes": text})
+    assert errors and rule.schedule_minutes == "5"
+
+
+def test_from_dict_accepts_legacy_string_numbers():
+    rule, errors = Rule.from_dict({"id": "3", "target_x": "640", "interval": "2.5", "strict": True})
+    assert errors == []
+    assert (rule.id, rule.target_x, rule.interval, rule.strict) == (3, 640, 2.5, True)
+
+
+def test_from_dict_without_valid_id():
+    rule, errors = Rule.from_dict({"id": "x"})
+    assert rule is None and errors
+
+
+def test_update_skips_bad_and_unknown_fields():
+    rule = Rule(id=1, target_x=800)
+    errors = rule.update({"target_x": "wide", "enabled": "yes", "colour": 1, "id": 9, "location": "A"})
+    assert len(errors) == 4
+    assert (rule.id, rule.target_x, rule.enabled, rule.location) == (1, 800, False, "A")
+
+
+@pytest.mark.parametrize("kind, value, expected", [
+    (int, 3.0, 3),
+    (int, "-2", -2),
+    (float, 1, 1.0),
+    (str, None, ""),
+    (list, None, None),
+])
+def test_coerce(kind, value, expected):
+    from rule_model import _coerce
+    assert _coerce(kind, value) == expected
+
+
+@pytest.mark.parametrize("kind, value", [(int, True), (int, 1.5), (bool, 1), (str, 3), (float, "x")])
+def test_coerce_rejects(kind, value):
+    from rule_model import _coerce
+    with pytest.raises(ValueError):
+        _coerce(kind, value)
+
+
+def test_variants_round_trip_and_default():
+    from rule_model import variants_from_text, variants_to_text
+    variants = variants_from_text("320x240 webp 70 -t\n1280x720 jpg")
+    assert variants_from_text(variants_to_text(variants)) == variants
+    rule = Rule(id=1, target_x=100, target_y=50)
+    assert rule.output_variants() == [{"size": [100, 50], "format": "jpeg", "quality": 0, "suffix": "-s"}]
+    rule.variants = variants
+    assert [v["size"] for v in rule.output_variants()] == [[1280, 720], [320, 240]]
+
+
+@pytest.mark.parametrize("variants", [
+    [{"size": [10, 10], "suffix": "-o"}],
+    [{"size": [10, 10], "suffix": "../x"}],
+    [{"size": [10, 10], "format": "gif"}],
+    [{"size": [10, 10]}, {"size": [10, 10]}],
+])
+def test_bad_variants_rejected(variants):
+    rule = Rule(id=1)
+    assert rule.update({"variants": variants})
+    assert rule.variants == []
@@ -0,0 +1,359 @@
+import io
+import os
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+from rule_model import Rule
+from task_engine import TaskEngine, quick_integrity
+
+
+class ListLogger:
+    def __init__(self):
+        self.lines = []
+
+    def write_log(self, text, **fields):
+        self.lines.append((text, fields))
+
+    def outcomes(self):
+        return [f.get("outcome") for _, f in self.lines if "rule" in f]
+
+
+def jpeg_bytes(color=(10, 200, 30), size=(64, 48)):
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+def garbled_jpeg():
+    """SOI / EOI 都在 (標記檢查通過)，但 Huffman 表壞掉，解碼會失敗"""
+    data = bytearray(jpeg_bytes())
+    dht = data.find(b"\xff\xc4")
+    data[dht + 5:dht + 21] = b"\xff" * 16
+    return bytes(data)
+
+
+def make_rule(tmp_path, rid=1, **kwargs):
+    for name in ("src", "out", "rest"):
+        (tmp_path / name).mkdir(parents=True, exist_ok=True)
+    return Rule(id=rid, location=f"L{rid}", source_dir=str(tmp_path / "src"),
+                source_filename=f"cam{rid}.jpg", output_dir=str(tmp_path / "out"),
+                restore_dir=str(tmp_path / "rest"), target_x=32, target_y=24, enabled=True, **kwargs)
+
+
+def make_engine(rules, **settings):
+    logger = ListLogger()
+    engine = TaskEngine(rules, logger, start=False, settings=dict({"scan_workers": 1}, **settings))
+    return engine, logger
+
+
+def write_source(rule, data):
+    with open(os.path.join(rule.source_dir, rule.source_filename), "wb") as f:
+        f.write(data)
+
+
+def test_undecodable_frame_is_broken_and_keeps_backup(tmp_path):
+    rule = make_rule(tmp_path)
+    engine, logger = make_engine([rule])
+    good = jpeg_bytes()
+    write_source(rule, good)
+    engine._trigger_scan()
+
+    write_source(rule, garbled_jpeg())
+    engine._trigger_scan()
+
+    current = engine.snapshot().by_id[1]
+    assert current.count_broken == 1
+    assert current.last_stat is None
+    assert logger.outcomes()[-1] == "broken"
+    # 舊的 -o 沒被壞畫面蓋掉
+    with open(os.path.join(rule.output_dir, "cam1-o.jpg"), "rb") as f:
+        assert f.read() == good
+
+
+def test_history_only_records_fully_saved_frames(tmp_path):
+    rule = make_rule(tmp_path)
+    engine, _ = make_engine([rule], history_depth=3)
+    write_source(rule, jpeg_bytes())
+    engine._trigger_scan()
+    first = engine._history(rule.output_dir).latest(1)
+
+    write_source(rule, garbled_jpeg())
+    engine._trigger_scan()
+
+    assert engine._history(rule.output_dir).latest(1) == first
+
+
+def test_history_skips_frame_when_save_fails(tmp_path):
+    rule = make_rule(tmp_path)
+    engine, logger = make_engine([rule], history_depth=3)
+    write_source(rule, jpeg_bytes())
+    engine._trigger_scan()
+    first = engine._history(rule.output_dir).latest(1)
+
+    # -s 寫不進去 (同名目錄擋住)：這張畫面不算備份成功
+    os.remove(os.path.join(rule.output_dir, "cam1-s.jpg"))
+    os.mkdir(os.path.join(rule.output_dir, "cam1-s.jpg"))
+    write_source(rule, jpeg_bytes(color=(200, 10, 30)))
+    engine._trigger_scan()
+
+    assert logger.outcomes()[-1] == "save_failed"
+    assert engine._history(rule.output_dir).latest(1) == first
+
+
+def test_serial_pass_commits_when_one_rule_raises(tmp_path):
+    broken_dest = make_rule(tmp_path, rid=1)
+    blocker = tmp_path / "offline"
+    blocker.write_text("x")
+    broken_dest.restore_dir = str(blocker / "share")  # makedirs 一定失敗
+    good = make_rule(tmp_path, rid=2)
+    write_source(good, jpeg_bytes())
+    engine, logger = make_engine([broken_dest, good])
+
+    engine._trigger_scan()
+
+    snap = engine.snapshot()
+    assert snap.version == 1
+    assert snap.by_id[2].last_hash
+    assert any("規則 1 掃描例外" in text for text, _ in logger.lines)
+
+
+def test_schedule_requeues_rules_when_scan_raises(tmp_path):
+    rule = make_rule(tmp_path, interval=1.0)
+    engine, _ = make_engine([rule])
+    engine._schedule_tick(1000.0, "10")
+
+    def fail(*args, **kwargs):
+        raise OSError("share offline")
+    engine._trigger_scan = fail
+    with pytest.raises(OSError):
+        engine._schedule_tick(1002.0, "10")
+
+    assert [rid for _, rid in engine._sched_heap] == [1]
+    assert engine._sched_due[1] == engine._sched_heap[0][0]
+
+
+def test_backoff_is_capped_for_long_streaks(tmp_path):
+    rule = make_rule(tmp_path, interval=10.0, backoff=2.0)
+    engine, _ = make_engine([rule], backoff_max=3600.0)
+    engine._sched_streak[1] = 5000
+    assert engine._next_due(rule, 0.0, 10.0) == 3600.0
+    engine._sched_streak[1] = 3
+    assert engine._next_due(rule, 0.0, 10.0) == 80.0
+
+
+def test_bad_schedule_only_skips_that_rule(tmp_path):
+    bad = make_rule(tmp_path, rid=1)
+    bad.schedule_minutes = "0;30"  # 繞過 Rule.update，模擬舊版留下的壞值
+    good = make_rule(tmp_path, rid=2, interval=1.0)
+    engine, logger = make_engine([bad, good])
+
+    engine._schedule_tick(1000.0, "10")
+    engine._schedule_tick(1000.5, "10")
+
+    assert [rid for _, rid in engine._sched_heap] == [2]
+    assert sum("排程設定錯誤" in text for text, _ in logger.lines) == 1
+
+
+def test_async_hung_share_does_not_stall_live_shares(tmp_path, monkeypatch):
+    live = [make_rule(tmp_path / "live", rid=i) for i in range(1, 4)]
+    hung = [make_rule(tmp_path / "hung", rid=i) for i in range(4, 10)]
+    for rule in live:
+        write_source(rule, jpeg_bytes())
+    hung_dir = hung[0].source_dir
+
+    release = threading.Event()
+    real_exists = os.path.exists
+    def slow_exists(path):
+        if str(path).startswith(hung_dir):
+            release.wait(5)
+        return real_exists(path)
+    monkeypatch.setattr(os.path, "exists", slow_exists)
+
+    engine, logger = make_engine(live + hung, async_scan=True, io_timeout=0.5,
+                                 scan_workers=4, share_limit=8)
+    engine._share_key = lambda source_dir: os.path.basename(os.path.dirname(source_dir))
+    try:
+        started = time.monotonic()
+        engine._trigger_scan()
+        elapsed = time.monotonic() - started
+    finally:
+        release.set()
+
+    snap = engine.snapshot()
+    assert elapsed < 2.0
+    assert all(snap.by_id[r.id].last_hash for r in live)
+    assert all(snap.by_id[r.id].count_missing == 1 for r in hung)
+    assert sum("沒有回應" in text for text, _ in logger.lines) == 1
+
+
+def test_restore_target_name_is_fixed(tmp_path):
+    rule = make_rule(tmp_path)
+    rule.source_filename = "cam1.png"
+    rule.variants = [{"size": [32, 24], "format": "webp", "quality": 0, "suffix": "-w"}]
+    engine, _ = make_engine([rule], min_source_bytes=0)
+    Image.new("RGB", (64, 48), (1, 2, 3)).save(os.path.join(rule.source_dir, "cam1.png"))
+
+    for _ in range(3):  # 備份一次，之後無更新還原 -w.webp
+        engine._trigger_scan()
+
+    assert os.listdir(rule.restore_dir) == ["cam1.png"]
+
+
+def test_offline_camera_restores_once(tmp_path):
+    rule = make_rule(tmp_path)
+    engine, logger = make_engine([rule])
+    write_source(rule, jpeg_bytes())
+    engine._trigger_scan()
+
+    for _ in range(6):  # 相機離線：來源一直沒更新
+        engine._trigger_scan()
+
+    restores = [f["restore"] for _, f in logger.lines if "restore" in f]
+    assert restores == ["copy"] + ["skipped"] * 5
+    assert engine.snapshot().by_id[1].count_no_update == 6
+
+
+@pytest.mark.parametrize("settings, into_source, linked", [
+    ({}, False, False),                        # 預設不用硬連結
+    ({"restore_link": True}, False, True),
+    ({"restore_link": True}, True, False),     # 還原到相機上傳目錄時一律複製
+])
+def test_restore_link_policy(tmp_path, settings, into_source, linked):
+    rule = make_rule(tmp_path)
+    if into_source:
+        rule.restore_dir = rule.source_dir
+    engine, _ = make_engine([rule], **settings)
+    write_source(rule, jpeg_bytes())
+    engine._trigger_scan()
+    engine._trigger_scan()  # 無更新：還原 -s
+
+    restored = os.stat(os.path.join(rule.restore_dir, "cam1.jpg"))
+    backup = os.stat(os.path.join(rule.output_dir, "cam1-s.jpg"))
+    assert (restored.st_ino == backup.st_ino) == linked
+
+
+@pytest.mark.parametrize("data, verdict", [
+    (jpeg_bytes(), "ok"),
+    (jpeg_bytes() + b"\0" * 64, "ok"),
+    (jpeg_bytes() + b"TRAILER", "unknown"),
+    (jpeg_bytes()[:300], "broken"),
+    (jpeg_bytes()[:100], "broken"),
+    (b"GIF89a" + b"x" * 400, "unknown"),
+])
+def test_quick_integrity(data, verdict):
+    assert quick_integrity(data, 256)[0] == verdict
+
+
+def test_quick_integrity_png_and_bmp():
+    def encode(fmt):
+        buf = io.BytesIO()
+        Image.new("RGB", (64, 48), (1, 2, 3)).save(buf, fmt)
+        return buf.getvalue()
+    png, bmp = encode("PNG"), encode("BMP")
+    assert quick_integrity(png)[0] == "ok"
+    assert quick_integrity(png[:-20])[0] == "broken"
+    assert quick_integrity(bmp)[0] == "ok"
+    assert quick_integrity(bmp[:-10])[0] == "broken"
+
+
+def hang_stat(monkeypatch, hung_paths, release):
+    real_stat = os.stat
+    def slow_stat(path, *args, **kwargs):
+        if str(path) in hung_paths:
+            release.wait(6)
+        return real_stat(path, *args, **kwargs)
+    monkeypatch.setattr(os, "stat", slow_stat)
+
+
+@pytest.mark.parametrize("hung_ids, share_limit", [
+    ({1}, 1),      # 同分享的規則卡在閘門後面
+    ({1, 2}, 8),   # 執行緒都被卡住，其餘規則還在排隊
+])
+def test_parallel_pass_is_bounded_by_rule_timeout(tmp_path, monkeypatch, hung_ids, share_limit):
+    rules = [make_rule(tmp_path, rid=i) for i in range(1, 5)]
+    for rule in rules:
+        write_source(rule, jpeg_bytes())
+    release = threading.Event()
+    hang_stat(monkeypatch, {os.path.join(r.source_dir, r.source_filename) for r in rules if r.id in hung_ids},
+              release)
+    engine, logger = make_engine(rules, scan_workers=2, share_limit=share_limit, rule_timeout=0.5)
+    try:
+        started = time.monotonic()
+        engine._trigger_scan()
+        elapsed = time.monotonic() - started
+    finally:
+        release.set()
+        engine._pool.shutdown(wait=True)
+
+    assert elapsed < 3.0
+    assert all(not engine.snapshot().by_id[rid].last_hash for rid in hung_ids)
+    timed_out = {f"規則 {rid} 處理逾時" for rid in hung_ids}
+    assert timed_out <= {text.split(" (")[0] for text, _ in logger.lines}
+
+
+def test_async_share_hanging_on_read_does_not_stall_pass(tmp_path):
+    live = [make_rule(tmp_path / "live", rid=i) for i in range(1, 4)]
+    hung = [make_rule(tmp_path / "hung", rid=i) for i in range(4, 10)]
+    for rule in live + hung:
+        write_source(rule, jpeg_bytes())
+    hung_dir = hung[0].source_dir
+
+    engine, _ = make_engine(hung + live, async_scan=True, io_timeout=0.5, rule_timeout=0.5,
+                            scan_workers=4, share_limit=8)
+    engine._share_key = lambda source_dir: os.path.basename(os.path.dirname(source_dir))
+    release = threading.Event()
+    real_read = engine._read_source
+    def slow_read(path):
+        if path.startswith(hung_dir):
+            release.wait(8)  # 探測有回應，但讀檔卡住
+        return real_read(path)
+    engine._read_source = slow_read
+
+    try:
+        for scan in range(2):  # 第二輪：上一輪卡住的執行緒還佔著執行緒池
+            started = time.monotonic()
+            engine._trigger_scan()
+            assert time.monotonic() - started < 3.0
+            snap = engine.snapshot()
+            assert all(snap.by_id[r.id].last_hash for r in live)
+            assert all(snap.by_id[r.id].count_no_update == scan for r in live)
+    finally:
+        release.set()
+        engine._pool.shutdown(wait=True)
+
+
+def test_shards_follow_share_not_source_dir(tmp_path):
+    rules = [make_rule(tmp_path / "share" / f"cam{i}", rid=i) for i in range(1, 9)]
+    engine, _ = make_engine(rules)
+    engine._share_key = lambda source_dir: "share"
+    assert len({engine._shard_of(r, 4) for r in rules}) == 1
+
+
+@pytest.mark.parametrize("algo", ["blake2", "shake_128"])
+def test_unsupported_hash_algo_falls_back(tmp_path, algo):
+    engine, logger = make_engine([make_rule(tmp_path)], hash_algo=algo)
+    assert engine.hash_algo == "blake2b"
+    assert any(algo in text for text, _ in logger.lines)
+
+
+def test_variants_are_never_upscaled_from_draft(tmp_path, monkeypatch):
+    import task_engine
+    rule = make_rule(tmp_path)
+    # 依面積排序 80x60 在前，但 10x70 比它高
+    rule.variants = [{"size": [80, 60], "format": "jpeg", "quality": 0, "suffix": "-s"},
+                     {"size": [10, 70], "format": "jpeg", "quality": 0, "suffix": "-t"}]
+    engine, _ = make_engine([rule])
+    write_source(rule, jpeg_bytes(size=(640, 480)))
+    sources = []
+    real = task_engine.make_thumbnail
+    def spy(img, target_size, **kw):
+        sources.append((img.size, target_size))
+        return real(img, target_size, **kw)
+    monkeypatch.setattr(task_engine, "make_thumbnail", spy)
+    engine._trigger_scan()
+
+    assert len(sources) == 2
+    assert all(w >= tw and h >= th for (w, h), (tw, th) in sources)